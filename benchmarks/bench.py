@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+""" Benchmarks for the hexfilter parsing hot path.
+
+Synthetic logs (see synthlog.py) are generated for each log format and
+filtered with a number of HexFilterLinux configurations, using both the
+library API and the hexfilter command line tool. Each benchmark is run in a
+separate process so the peak RSS of every benchmark can be measured.
+
+The startup time of the command line tool is measured by running it on a
+log of only a few lines (see startup_log_lines).
+
+Results are printed as a table and can be saved as JSON and compared with a
+previous run:
+
+    $ python benchmarks/bench.py -o before.json
+    $ (make some changes)
+    $ python benchmarks/bench.py -o after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthlog
+
+# Filter (HexFilterLinux constructor) configurations
+filter_configs = {
+    'default': {},
+    'skip-ts': {'skip_timestamps': True},
+    'abs-ts-desc': {'abs_timestamps': True,
+                    'include_dump_desc_in_output': True},
+    'rounding': {'timestamps_round_us': 1000},
+    'desc-filter': {'dump_desc': ['sdio', 'htc tx', 'wmi'],
+                    'dump_desc_invert': ['sdio rd']},
+    'before-lines': {'keep_n_lines_before_each_dump': 3},
+    'skip-ascii': {'remove_ascii_part': True},
+}
+
+# Library API methods
+api_methods = ('parse_line', 'filter_file', 'filter_bytes')
+
+# Number of lines of the log used for measuring the startup time of the
+# command line tool
+startup_log_lines = 10
+
+# Command line tool configurations
+cli_configs = {
+    'cli': [],
+    'cli-mmap': ['--mmap'],
+    'cli-jobs': ['--jobs', '2'],
+}
+
+
+def _format_kwargs(log_format):
+
+    if log_format == 'none':
+        return {'log_has_timestamps': False}
+    if log_format == 'ftrace':
+        return {'ftrace_format': True}
+    return {}
+
+
+def _format_args(log_format):
+
+    if log_format == 'none':
+        return ['-n']
+    if log_format == 'ftrace':
+        return ['-f']
+    return []
+
+
+def _peak_rss_kb(rusage):
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
+
+def run_api(log_file, log_format, config, method):
+    """ Filters log_file in the current process and returns the elapsed time
+    and the number of output bytes. """
+
+    from hexfilter import HexFilterLinux
+
+    kwargs = dict(_format_kwargs(log_format), **filter_configs[config])
+    hf = HexFilterLinux(**kwargs)
+    output_len = 0
+
+    start = time.time()
+    if method == 'parse_line':
+        with open(log_file, "r") as fp:
+            for line in fp:
+                if hf.parse_line(line):
+                    before = hf.get_lines_before_hex()
+                    if before:
+                        output_len += len(before)
+                    output_len += len(hf.get_hex()) + 1
+    elif method == 'filter_file':
+        with open(log_file, "r") as fp:
+            for output in hf.filter_file(fp):
+                output_len += len(output)
+    elif method == 'filter_bytes':
+        with open(log_file, "rb") as fp:
+            for output in hf.filter_bytes(fp.read()):
+                output_len += len(output)
+    elapsed = time.time() - start
+
+    return elapsed, output_len
+
+
+def run_cli(log_file, log_format, config):
+    """ Runs the hexfilter tool on log_file and returns the elapsed time and
+    the peak RSS of the tool. """
+
+    cmd = [sys.executable, '-m', 'hexfilter', '-i', log_file] + \
+        _format_args(log_format) + cli_configs[config]
+    # Make sure the hexfilter package of this tree is benchmarked
+    env = dict(os.environ)
+    python_path = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+    if env.get('PYTHONPATH'):
+        python_path.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(python_path)
+
+    with open(os.devnull, "w") as devnull:
+        start = time.time()
+        proc = subprocess.Popen(cmd, stdout=devnull, env=env)
+        # wait4 gives the resource usage of this particular child
+        _, status, rusage = os.wait4(proc.pid, 0)
+        elapsed = time.time() - start
+    proc.returncode = status
+    if status != 0:
+        raise RuntimeError("{} failed".format(' '.join(cmd)))
+
+    return elapsed, _peak_rss_kb(rusage)
+
+
+def run_one(args):
+    """ Runs a single API benchmark (in a child process) and prints the
+    result as JSON. """
+
+    elapsed, output_len = run_api(args.log_file, args.log_format,
+                                  args.config, args.method)
+    rss = _peak_rss_kb(resource.getrusage(resource.RUSAGE_SELF))
+    json.dump({'seconds': elapsed, 'output_bytes': output_len,
+               'peak_rss_kb': rss}, sys.stdout)
+
+
+def _result(name, log_format, log_info, seconds, peak_rss_kb):
+
+    lines, size = log_info
+    return {
+        'name': name,
+        'format': log_format,
+        'lines': lines,
+        'bytes': size,
+        'seconds': seconds,
+        'lines_per_sec': lines / seconds if seconds else None,
+        'mb_per_sec': size / 1E6 / seconds if seconds else None,
+        'peak_rss_kb': peak_rss_kb,
+    }
+
+
+def run_startup(args, tmp_dir):
+    """ Measures the startup time of the command line tool, i.e. the time
+    for filtering a log of startup_log_lines lines. """
+
+    log_file = os.path.join(tmp_dir, 'log_startup.txt')
+    with open(log_file, "w") as fp:
+        lines = synthlog.generate(fp, num_lines=startup_log_lines,
+                                  seed=args.seed)
+    log_info = (lines, os.path.getsize(log_file))
+
+    best = None
+    for _ in range(args.startup_repeat):
+        result = run_cli(log_file, 'printk', 'cli')
+        if best is None or result[0] < best[0]:
+            best = result
+    return _result('cli-startup', 'printk', log_info, *best)
+
+
+def run_all(args, tmp_dir):
+
+    results = []
+    if args.startup_repeat > 0:
+        results.append(run_startup(args, tmp_dir))
+        _print_result(results[-1])
+
+    for log_format in args.formats:
+        log_file = os.path.join(tmp_dir, 'log_{}.txt'.format(log_format))
+        with open(log_file, "w") as fp:
+            lines = synthlog.generate(fp, log_format=log_format,
+                                      num_lines=args.lines,
+                                      hex_ratio=args.hex_ratio,
+                                      desc_count=args.desc_count,
+                                      row_size=args.row_size,
+                                      seed=args.seed)
+        log_info = (lines, os.path.getsize(log_file))
+
+        for config in sorted(filter_configs):
+            for method in api_methods:
+                name = '{}/{}'.format(config, method)
+                best = None
+                for _ in range(args.repeat):
+                    cmd = [sys.executable, os.path.abspath(__file__),
+                           '--run-one', log_file, log_format, config, method]
+                    result = json.loads(subprocess.check_output(cmd).decode())
+                    if best is None or result['seconds'] < best['seconds']:
+                        best = result
+                results.append(_result(name, log_format, log_info,
+                                       best['seconds'], best['peak_rss_kb']))
+                _print_result(results[-1])
+
+        for config in sorted(cli_configs):
+            best = None
+            for _ in range(args.repeat):
+                result = run_cli(log_file, log_format, config)
+                if best is None or result[0] < best[0]:
+                    best = result
+            results.append(_result(config, log_format, log_info, *best))
+            _print_result(results[-1])
+
+    return results
+
+
+def _print_result(result, baseline=None):
+
+    line = '{:<8} {:<28} {:>9.1f} ms {:>12.0f} lines/s {:>8.2f} MB/s ' \
+        '{:>8} kB'.format(result['format'], result['name'],
+                          result['seconds'] * 1000, result['lines_per_sec'],
+                          result['mb_per_sec'], result['peak_rss_kb'])
+    if baseline:
+        line += '  {:+6.1f}%'.format(
+            (result['lines_per_sec'] / baseline['lines_per_sec'] - 1) * 100)
+    print(line)
+
+
+def compare(results, baseline_file):
+
+    with open(baseline_file) as fp:
+        baseline = json.load(fp)
+    baseline_results = dict(((r['format'], r['name']), r)
+                            for r in baseline['results'])
+
+    print('\nCompared with {}:'.format(baseline_file))
+    for result in results:
+        _print_result(result,
+                      baseline_results.get((result['format'], result['name'])))
+
+
+def load_options():
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for the hexfilter parsing hot path")
+    parser.add_argument('-o', '--output-file',
+                        help="Save the results as JSON to this file")
+    parser.add_argument('--compare', metavar='JSON_FILE',
+                        help="Compare the results with a previous run")
+    parser.add_argument('--formats', nargs='+', choices=synthlog.log_formats,
+                        default=list(synthlog.log_formats),
+                        help="Log formats to benchmark (default all)")
+    parser.add_argument('--lines', type=int, default=200000,
+                        help="Number of lines per log (default 200000)")
+    parser.add_argument('--hex-ratio', type=float, default=0.5,
+                        help="Ratio of hex dump lines (default 0.5)")
+    parser.add_argument('--desc-count', type=int, default=4,
+                        help="Number of distinct dump descriptions "
+                             "(default 4)")
+    parser.add_argument('--row-size', type=int, default=16,
+                        help="Number of hex values per line (default 16)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Random seed (default 0)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of runs of each benchmark. The fastest "
+                             "run is reported (default 3)")
+    parser.add_argument('--startup-repeat', type=int, default=20,
+                        help="Number of runs of the startup benchmark. The "
+                             "fastest run is reported. 0 skips the startup "
+                             "benchmark (default 20)")
+    parser.add_argument('--run-one', nargs=4,
+                        metavar=('LOG_FILE', 'FORMAT', 'CONFIG', 'METHOD'),
+                        help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = load_options()
+    if args.run_one:
+        args.log_file, args.log_format, args.config, args.method = args.run_one
+        run_one(args)
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix='hexfilter-bench-')
+    try:
+        results = run_all(args, tmp_dir)
+    finally:
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if args.output_file:
+        with open(args.output_file, "w") as fp:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'options': {'lines': args.lines, 'hex_ratio': args.hex_ratio,
+                            'desc_count': args.desc_count,
+                            'row_size': args.row_size, 'seed': args.seed},
+                'results': results,
+            }, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
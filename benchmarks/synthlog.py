@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+""" Generator for synthetic kernel logs containing print_hex_dump output.
+
+The generated logs are used by the benchmarks (see bench.py), but the
+generator can also be run on its own:
+
+    $ python benchmarks/synthlog.py --format printk --lines 100000 -o log.txt
+"""
+
+import argparse
+import random
+import sys
+
+# Supported log formats:
+# printk -- Lines with printk timestamps: [  410.085422] sdio wr 00000000: ...
+# none   -- Lines without timestamps: sdio wr 00000000: ...
+# ftrace -- ftrace output: AR6K Async-768   [000] ....   277.806985: ...
+log_formats = ('printk', 'none', 'ftrace')
+
+_desc_prefixes = ('sdio wr', 'sdio rd', 'htc tx', 'htc rx', 'wmi cmd',
+                  'wmi evt', 'usb out', 'usb in', 'spi xfer', 'i2c msg')
+
+_non_hex_messages = (
+    'usb 1-1: new high-speed USB device number {} using xhci_hcd',
+    'ath10k_sdio mmc1:0001:1: firmware crashed! (guid {})',
+    'wlan0: authenticate with 00:11:22:33:44:{:02x}',
+    'IPv6: ADDRCONF(NETDEV_CHANGE): wlan0: link becomes ready',
+    'mmc1: queuing unknown CIS tuple 0x{:02x} (3 bytes)',
+    'EXT4-fs (sda1): mounted filesystem with ordered data mode. Opts: (null)',
+    'random: crng init done',
+    'audit: type=1400 audit({}.123:42): apparmor="STATUS" operation="profile_load"',
+)
+
+
+def _descs(desc_count):
+
+    descs = []
+    for i in range(desc_count):
+        prefix = _desc_prefixes[i % len(_desc_prefixes)]
+        if i >= len(_desc_prefixes):
+            prefix = '{}{}'.format(prefix, i // len(_desc_prefixes))
+        descs.append(prefix + ' ')
+    return descs
+
+
+def _hex_dump_lines(rnd, desc, length, row_size):
+    """ Returns the lines of a hex dump in the same format as print_hex_dump
+    (DUMP_PREFIX_OFFSET, groupsize 1, ascii=true). """
+
+    ascii_column = row_size * 3 + 1
+    lines = []
+    for offset in range(0, length, row_size):
+        values = [rnd.randint(0, 255)
+                  for _ in range(min(row_size, length - offset))]
+        hex_part = ' '.join('{:02x}'.format(v) for v in values)
+        ascii_part = ''.join(chr(v) if 32 <= v < 127 else '.' for v in values)
+        lines.append('{}{:08x}: {}{}'.format(desc, offset,
+                                             hex_part.ljust(ascii_column),
+                                             ascii_part))
+    return lines
+
+
+def generate(fp, log_format='printk', num_lines=100000, hex_ratio=0.5,
+             desc_count=4, row_size=16, max_dump_len=256, seed=0):
+    """ Writes a synthetic log with (approximately) num_lines lines to fp.
+
+    Keyword arguments:
+    log_format   -- (string) One of log_formats (default 'printk')
+    num_lines    -- (int) Number of lines (default 100000)
+    hex_ratio    -- (float) Ratio of hex dump lines to all lines (default 0.5)
+    desc_count   -- (int) Number of distinct dump descriptions (default 4)
+    row_size     -- (int) Number of hex values per dump line (default 16)
+    max_dump_len -- (int) Maximum number of bytes in each dump (default 256)
+    seed         -- (int) Random seed (default 0)
+
+    Returns the number of written lines.
+    """
+
+    rnd = random.Random(seed)
+    descs = _descs(desc_count)
+    avg_dump_lines = max(1.0, (max_dump_len / 2.0) / row_size)
+    # Probability of starting a dump instead of writing a non hex line
+    if hex_ratio >= 1.0:
+        dump_probability = 1.0
+    else:
+        dump_probability = hex_ratio / (hex_ratio + (1 - hex_ratio) * avg_dump_lines)
+
+    ts = 0.0
+    written = 0
+    while written < num_lines:
+        if rnd.random() < dump_probability:
+            lines = _hex_dump_lines(rnd, rnd.choice(descs),
+                                    rnd.randint(1, max_dump_len), row_size)
+        else:
+            message = rnd.choice(_non_hex_messages)
+            lines = [message.format(rnd.randint(0, 255))]
+
+        for line in lines[:num_lines - written]:
+            ts += rnd.random() * 0.001
+            if log_format == 'printk':
+                line = '[{:12.6f}] {}'.format(ts, line)
+            elif log_format == 'ftrace':
+                line = '   kworker/0:1-{}   [000] ....  {:11.6f}: ' \
+                       '__dump_sdio_hex: {}'.format(42, ts, line)
+            fp.write(line)
+            fp.write('\n')
+            written += 1
+
+    return written
+
+
+def load_options():
+
+    parser = argparse.ArgumentParser(
+        description="Generates synthetic kernel logs with hex dumps")
+    parser.add_argument('-o', '--output-file',
+                        help="Output file. If omitted, the log will be "
+                             "written to stdout")
+    parser.add_argument('--format', choices=log_formats, default='printk',
+                        help="Log format (default printk)")
+    parser.add_argument('--lines', type=int, default=100000,
+                        help="Number of lines (default 100000)")
+    parser.add_argument('--hex-ratio', type=float, default=0.5,
+                        help="Ratio of hex dump lines (default 0.5)")
+    parser.add_argument('--desc-count', type=int, default=4,
+                        help="Number of distinct dump descriptions "
+                             "(default 4)")
+    parser.add_argument('--row-size', type=int, default=16,
+                        help="Number of hex values per line (default 16)")
+    parser.add_argument('--max-dump-len', type=int, default=256,
+                        help="Maximum number of bytes per dump (default 256)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Random seed (default 0)")
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = load_options()
+    if args.output_file:
+        fp = open(args.output_file, "w")
+    else:
+        fp = sys.stdout
+
+    generate(fp, log_format=args.format, num_lines=args.lines,
+             hex_ratio=args.hex_ratio, desc_count=args.desc_count,
+             row_size=args.row_size, max_dump_len=args.max_dump_len,
+             seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
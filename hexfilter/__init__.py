@@ -1 +1 @@
-from .hexfilter import HexFilterLinux
+from .hexfilter import HexFilterLinux, HexDumpRecord
@@ -1,8 +1,17 @@
-from hexfilter import HexFilterLinux
+# Only the modules needed for parsing the options (and for all modes) are
+# imported here. The modules of the different modes (e.g. multiprocessing for
+# --jobs) are imported when the mode is selected, see main.
+from hexfilter.compress import detect_compression, compression_from_name, \
+    detect_stream_compression, filter_input, open_compressed, open_input, \
+    open_output, PrefixedReader
+from hexfilter.columnar import export_formats, default_chunk_size
+from hexfilter.dedup import default_dedup_cache_size
+from hexfilter.formats import hex_dump_formats, detect_data_format, \
+    detect_file_format, detect_sample_size, read_sample
+from hexfilter.index import index_path
 
 import argparse
-import pdb
-import traceback
+import mmap
 import sys
 import os
 
@@ -10,30 +19,49 @@ description = \
     "hexfilter scans input (log) files for lines containing hex dumps.\n" \
     "When a line containing a hex dump is encountered, hexfilter will write it\n" \
     "to an output file or stdout (depending on input arguments, see below).\n\n" \
-    "The current version of the tool only support linux kernel hex dumps, i.e.\n" \
-    "dumps produced by the print_hex_dump* functions in the kernel.\n\n" \
+    "By default, hexfilter filters linux kernel hex dumps, i.e. dumps\n" \
+    "produced by the print_hex_dump* functions in the kernel. Other dump\n" \
+    "formats (xxd, hexdump -C, od, U-Boot md.b and Zephyr LOG_HEXDUMP) are\n" \
+    "selected with --format.\n\n" \
     "The Linux kernel can be configured to add timestamps to all log messages.\n" \
     "It is recommended to have those timestamps enabled when using hexfilter\n" \
     "since it is capable of extracting timing information from the logs.\n\n" \
     "If the kernel logs does not contain any timestamps, arguments -n or\n" \
     "--no-timestamps must be used, otherwise the hex dump data can't be\n" \
-    "interpreted.\n\n"
+    "interpreted.\n\n" \
+    "Compressed (gzip, xz, zstd or bz2) input files and stdin are\n" \
+    "detected automatically. The output file is compressed if its name\n" \
+    "ends with .gz, .xz, .zst or .bz2.\n\n"
+
+# Default size of the output file buffer (see --output-buffer-size)
+default_output_buffer_size = 1 << 20
 
 epilog = \
     "For full documentation, please visit:\n\n" \
     "http://hexfilter.readthedocs.io\n\n"
 
 
+diff_hint = \
+    "Use 'hexfilter diff --help' for comparing the hex dumps of two logs.\n\n"
+
+
 def load_options():
-    global parsed_args
+    global parsed_args, parser
     parser = argparse.ArgumentParser(prog="hexfilter",
                                      description=description,
-                                     epilog=epilog,
+                                     epilog=diff_hint + epilog,
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
 
-    parser.add_argument('-i', '--input-file',
+    parser.add_argument('-i', '--input-file', nargs='+', metavar='INPUT',
                         help="Input (log) file to filter. If omitted, "
-                             "stdin will be read")
+                             "stdin will be read. "
+                             "Several files, glob patterns or directories "
+                             "(filtered recursively) select batch mode: "
+                             "each file is filtered separately and written "
+                             "to --output-dir (see --output-template). "
+                             "With --jobs N, N files are filtered in "
+                             "parallel. A throughput summary is written to "
+                             "stderr.")
     parser.add_argument('-o', '--output-file',
                         help="Filtered output file. If omitted, "
                              "the output will be written to stdout")
@@ -80,51 +108,615 @@ def load_options():
                              "These non hex dump lines will be added to the "
                              "filtered output before every burst of detected "
                              "hex dumps. ")
+    parser.add_argument('-A', '--keep-non-hex-after', type=int, default=0,
+                        metavar='N',
+                        help="Keep N non hex dump lines from the input after "
+                             "each valid hex dump (like grep -A). "
+                             "Lines kept after a dump are not repeated "
+                             "before the next dump.")
     parser.add_argument('--skip-ascii', action="store_true",
                         help="Don't include the ascii part of the hexdump in "
                              "the output.")
+    parser.add_argument('-m', '--mmap', action="store_true",
+                        help="Memory map the input file and filter it as raw "
+                             "bytes instead of decoding every line. "
+                             "Only lines containing hex dumps will be decoded. "
+                             "Requires --input-file.")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help="Filter the input file with N parallel worker "
+                             "processes. The file is split into chunks "
+                             "that are filtered separately and merged in the "
+                             "original order. Requires --input-file.")
+    parser.add_argument('-p', '--payload-output', choices=['raw', 'records'],
+                        help="Write the hex dump data as binary payloads "
+                             "instead of text. Consecutive dump lines with "
+                             "the same description and contiguous addresses "
+                             "are merged into one payload. "
+                             "raw: the payload bytes are written without any "
+                             "separation. "
+                             "records: each payload is written as a length "
+                             "prefixed record (see hexfilter.payload).")
+    parser.add_argument('--export', metavar='PATH',
+                        help="Export the parsed hex dump lines to PATH in a "
+                             "columnar format for analysis (e.g. with "
+                             "pandas) instead of writing text. Each line is "
+                             "a row with the columns ts, ts_diff, desc, "
+                             "addr and data (the payload bytes). The rows "
+                             "are written in chunks of --export-chunk-size "
+                             "rows. The format is given by --export-format.")
+    parser.add_argument('--export-format', default='auto',
+                        choices=['auto'] + list(export_formats),
+                        help="Format of --export. "
+                             "parquet: Parquet file (requires pyarrow). "
+                             "arrow: Arrow IPC file (requires pyarrow). "
+                             "npz: NumPy .npz file (requires numpy). "
+                             "raw: directory with one binary file per "
+                             "column. "
+                             "auto: given by the extension of PATH "
+                             "(.parquet, .arrow, .feather or .npz), "
+                             "otherwise the first available of parquet, "
+                             "npz and raw (default).")
+    parser.add_argument('--export-chunk-size', type=int,
+                        default=default_chunk_size, metavar='N',
+                        help="Used with --export. Number of rows written at "
+                             "a time (one Parquet row group or Arrow record "
+                             "batch). Default {}".format(default_chunk_size))
+    parser.add_argument('--dedup', action="store_true",
+                        help="Remove repeated bursts of hex dumps from the "
+                             "output. A burst (consecutive dump lines with "
+                             "the same description and contiguous "
+                             "addresses) with the same data as an earlier "
+                             "burst is replaced by a line referring to the "
+                             "output line of the first occurrence. "
+                             "Consecutive repeats are merged into one line "
+                             "with a repeat count. Non hex lines kept before "
+                             "a repeated burst (see --keep-non-hex-before) "
+                             "are output before its reference line.")
+    parser.add_argument('--dedup-cache-size', type=int,
+                        default=default_dedup_cache_size, metavar='N',
+                        help="Used with --dedup. Number of distinct bursts "
+                             "remembered. The least recently seen bursts "
+                             "are forgotten first. "
+                             "Default {}".format(default_dedup_cache_size))
+    parser.add_argument('--follow', action="store_true",
+                        help="Streaming mode for live logs. The input is read "
+                             "without buffering and each filtered dump is "
+                             "written as soon as its line is complete. "
+                             "If the input is a file, hexfilter will keep "
+                             "waiting for new data at the end of the file "
+                             "(like tail -f).")
+    parser.add_argument('--flush-interval', type=float, default=0.0,
+                        metavar='SECONDS',
+                        help="Used with --follow. Minimum time between output "
+                             "flushes while there is more input to read. "
+                             "Pending output is always flushed when hexfilter "
+                             "is waiting for input. "
+                             "Default 0 (flush after every read)")
+    parser.add_argument('--flush-records', type=int, default=0, metavar='N',
+                        help="Used with --follow. Flush the output when N "
+                             "filtered lines are pending, regardless of "
+                             "--flush-interval. Default 0 (no limit)")
+    parser.add_argument('--sources', nargs='+', metavar='SRC',
+                        help="Filter several sources concurrently. "
+                             "Each source is either a file, FIFO or serial "
+                             "port path, a TCP connection (tcp:HOST:PORT) or "
+                             "a UNIX socket connection (unix:PATH). "
+                             "The output of each source is written to a "
+                             "separate file in --output-dir. "
+                             "Can't be combined with --input-file or "
+                             "--output-file.")
+    parser.add_argument('--output-dir', metavar='DIR',
+                        help="Output directory used with --sources and in "
+                             "batch mode (see --input-file)")
+    parser.add_argument('--output-template', metavar='TEMPLATE',
+                        help="Output path (relative to --output-dir) of each "
+                             "input file in batch mode. The fields {path}, "
+                             "{dir}, {name}, {stem} and {ext} are replaced "
+                             "by the path of the input file relative to the "
+                             "common parent directory of all input files, "
+                             "its directory, file name, file name without "
+                             "extension and extension, e.g. "
+                             "'{dir}/{stem}.hex.gz'. "
+                             "Default '{path}' (mirror the input files)")
+    parser.add_argument('--debug', action="store_true",
+                        help="Print the traceback and start the post-mortem "
+                             "debugger (pdb) on unexpected errors.")
+    parser.add_argument('--stats', nargs='?', const='-', metavar='FILE',
+                        help="Count the lines passing and the dumps rejected "
+                             "by each stage of the filter (regex, "
+                             "description, hex/ASCII validation) and time "
+                             "each stage. Without FILE, a summary is written "
+                             "to stderr at exit. With FILE, the statistics "
+                             "are written to FILE as JSON. "
+                             "Timing the stages slows down the filtering.")
+    parser.add_argument('--start-ts', type=float, metavar='SECONDS',
+                        help="Skip all dumps with a log timestamp before "
+                             "SECONDS. If the input file is seekable, the "
+                             "first dump is found with a binary search "
+                             "instead of parsing the file from the start. "
+                             "Delta times are relative to the first dump "
+                             "in the time window. "
+                             "The log timestamps are assumed to be "
+                             "increasing.")
+    parser.add_argument('--end-ts', type=float, metavar='SECONDS',
+                        help="Stop at the first dump with a log timestamp "
+                             "after SECONDS.")
+    parser.add_argument('--output-buffer-size', type=int,
+                        default=default_output_buffer_size, metavar='BYTES',
+                        help="Size of the output buffer. The filtered output "
+                             "is written in blocks of this size, except in "
+                             "--follow mode where it is also written when "
+                             "waiting for input. "
+                             "Default {} (1 MiB)".format(
+                                 default_output_buffer_size))
+    parser.add_argument('--index', action="store_true",
+                        help="Use a sidecar index of all hex dump lines of "
+                             "the input file (INPUT_FILE" + index_path('') +
+                             "). The index is built on the first run and "
+                             "rebuilt whenever the input file has changed. "
+                             "Later runs only read the dump lines selected "
+                             "by --desc-str and --desc-str-invert. "
+                             "Requires --input-file.")
+    parser.add_argument('--format', default='linux',
+                        choices=['auto'] + list(hex_dump_formats),
+                        help="Hex dump format of the input. "
+                             "linux: print_hex_dump (default). "
+                             "xxd: xxd output. "
+                             "hexdump: hexdump -C output. "
+                             "od: od -A x -t x1z output. "
+                             "uboot: U-Boot md.b output. "
+                             "zephyr: Zephyr LOG_HEXDUMP output. "
+                             "auto: detect the format (and whether the log "
+                             "has timestamps) from the first {} KiB of the "
+                             "input.".format(detect_sample_size >> 10))
 
     parsed_args = parser.parse_args()
+    inputs = parsed_args.input_file or []
+    parsed_args.batch = len(inputs) > 1 or \
+        any(os.path.isdir(path) or
+            (not os.path.exists(path) and
+             any(c in path for c in '*?['))
+            for path in inputs)
+    parsed_args.input_file = inputs[0] if inputs else None
+    parsed_args.input_files = inputs
+    if parsed_args.stats and (parsed_args.batch or parsed_args.jobs > 1 or
+                              parsed_args.sources):
+        parser.error("--stats can't be combined with several input files, "
+                     "--jobs or --sources")
+    if parsed_args.export:
+        if parsed_args.batch or parsed_args.jobs > 1 or \
+           parsed_args.payload_output or parsed_args.follow or \
+           parsed_args.sources or parsed_args.dedup or \
+           parsed_args.output_file:
+            parser.error("--export can't be combined with several input "
+                         "files, --jobs, --payload-output, --follow, "
+                         "--sources, --dedup or --output-file")
+        if parsed_args.export_chunk_size < 1:
+            parser.error("--export-chunk-size must be at least 1")
+    if parsed_args.dedup:
+        if parsed_args.batch or parsed_args.jobs > 1 or \
+           parsed_args.payload_output or parsed_args.follow or \
+           parsed_args.sources or parsed_args.keep_non_hex_after > 0:
+            parser.error("--dedup can't be combined with several input "
+                         "files, --jobs, --payload-output, --follow, "
+                         "--sources or --keep-non-hex-after")
+        if parsed_args.dedup_cache_size < 1:
+            parser.error("--dedup-cache-size must be at least 1")
+    if parsed_args.batch:
+        if not parsed_args.output_dir:
+            parser.error("Several input files require --output-dir")
+        if parsed_args.output_file or parsed_args.follow or \
+           parsed_args.sources or parsed_args.index:
+            parser.error("Several input files can't be combined with "
+                         "--output-file, --follow, --sources or --index")
+        # --jobs is the number of files filtered in parallel
+        return
+    if parsed_args.output_template is not None:
+        parser.error("--output-template requires several input files")
+    if parsed_args.mmap and not parsed_args.input_file:
+        parser.error("--mmap requires --input-file")
+    if parsed_args.jobs > 1 and not parsed_args.input_file:
+        parser.error("--jobs requires --input-file")
+    if parsed_args.jobs > 1 and parsed_args.payload_output:
+        parser.error("--jobs can't be combined with --payload-output")
+    if parsed_args.sources:
+        if not parsed_args.output_dir:
+            parser.error("--sources requires --output-dir")
+        if parsed_args.input_file or parsed_args.output_file or \
+           parsed_args.mmap or parsed_args.jobs > 1 or \
+           parsed_args.payload_output or parsed_args.follow:
+            parser.error("--sources can't be combined with --input-file, "
+                         "--output-file, --mmap, --jobs, --payload-output "
+                         "or --follow")
+    if parsed_args.follow and (parsed_args.mmap or parsed_args.jobs > 1 or
+                               parsed_args.payload_output):
+        parser.error("--follow can't be combined with --mmap, --jobs or "
+                     "--payload-output")
+    if parsed_args.start_ts is not None or parsed_args.end_ts is not None:
+        if parsed_args.no_timestamps:
+            parser.error("--start-ts and --end-ts require log timestamps")
+        if parsed_args.jobs > 1:
+            parser.error("--start-ts and --end-ts can't be combined with "
+                         "--jobs")
+    if parsed_args.output_buffer_size < 1:
+        parser.error("--output-buffer-size must be at least 1")
+    if parsed_args.index:
+        if not parsed_args.input_file:
+            parser.error("--index requires --input-file")
+        if parsed_args.mmap or parsed_args.jobs > 1 or parsed_args.follow or \
+           parsed_args.sources or parsed_args.keep_non_hex_before > 0 or \
+           parsed_args.keep_non_hex_after > 0:
+            parser.error("--index can't be combined with --mmap, --jobs, "
+                         "--follow, --sources, --keep-non-hex-before or "
+                         "--keep-non-hex-after")
+    if parsed_args.format != 'linux' and parsed_args.ftrace:
+        parser.error("--ftrace can only be used with --format linux")
+    if parsed_args.format == 'auto' and parsed_args.sources:
+        parser.error("--format auto can't be combined with --sources")
+
+
+diff_description = \
+    "hexfilter diff compares the hex dumps of two (log) files.\n\n" \
+    "Both files are filtered at the same time and consecutive dump lines\n" \
+    "are merged into bursts (see --payload-output). The bursts of the two\n" \
+    "files are aligned by description and address and their data bytes are\n" \
+    "compared. Timestamps are ignored. Only the bursts that differ are\n" \
+    "written, with the rows of INPUT_A prefixed by '-' and the rows of\n" \
+    "INPUT_B prefixed by '+'.\n\n" \
+    "The exit status is 0 if the hex dumps are equal and 1 if they differ.\n\n"
+
+
+def load_diff_options(args):
+    global parsed_args
+    from hexfilter.diff import default_diff_window
+
+    parser = argparse.ArgumentParser(prog="hexfilter diff",
+                                     description=diff_description,
+                                     epilog=epilog,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('input_a', metavar='INPUT_A',
+                        help="First input (log) file")
+    parser.add_argument('input_b', metavar='INPUT_B',
+                        help="Second input (log) file")
+    parser.add_argument('-o', '--output-file',
+                        help="Output file for the differences. If omitted, "
+                             "the differences will be written to stdout")
+    parser.add_argument('-n', '--no-timestamps', action="store_true",
+                        help="Specifies whether or not the input files "
+                             "contain time stamps.")
+    parser.add_argument('-f', '--ftrace', action="store_true",
+                        help="Specifies whether or not the input files "
+                             "are ftrace outputs (have ftrace format).")
+    parser.add_argument('-d', '--desc-str', nargs='+', type=str,
+                        help="Only compare dumps with a description string "
+                             "matching any of the provided desc strings.")
+    parser.add_argument('-v', '--desc-str-invert', nargs='+', type=str,
+                        help="Don't compare dumps with a description string "
+                             "matching any of the provided desc strings.")
+    parser.add_argument('--format', default='linux',
+                        choices=['auto'] + list(hex_dump_formats),
+                        help="Hex dump format of the inputs (see hexfilter "
+                             "--help). auto: detect the format of each "
+                             "input separately.")
+    parser.add_argument('-w', '--window', type=int,
+                        default=default_diff_window, metavar='N',
+                        help="Number of bursts of each input looked ahead "
+                             "when the inputs diverge, in order to find "
+                             "the point where they are in sync again. "
+                             "Limits the memory usage. "
+                             "Default {}".format(default_diff_window))
+    parser.add_argument('--debug', action="store_true",
+                        help="Print the traceback and start the post-mortem "
+                             "debugger (pdb) on unexpected errors.")
+
+    parsed_args = parser.parse_args(args)
+    if parsed_args.window < 1:
+        parser.error("--window must be at least 1")
+    if parsed_args.format != 'linux' and parsed_args.ftrace:
+        parser.error("--ftrace can only be used with --format linux")
+
+
+def diff_files():
+    from hexfilter.diff import iter_file_payloads, diff_payloads, format_diff
+
+    filter_kwargs = dict(dump_desc=parsed_args.desc_str,
+                         dump_desc_invert=parsed_args.desc_str_invert,
+                         log_has_timestamps=(not parsed_args.no_timestamps),
+                         ftrace_format=parsed_args.ftrace)
+    payloads_a = iter_file_payloads(parsed_args.input_a, parsed_args.format,
+                                    filter_kwargs)
+    payloads_b = iter_file_payloads(parsed_args.input_b, parsed_args.format,
+                                    filter_kwargs)
+
+    if parsed_args.output_file:
+        outfp = open(parsed_args.output_file, "w",
+                     default_output_buffer_size)
+    else:
+        outfp = os.fdopen(os.dup(sys.stdout.fileno()), "w",
+                          default_output_buffer_size)
+    counts = {'changed': 0, 'removed': 0, 'added': 0}
+    try:
+        for diff in diff_payloads(payloads_a, payloads_b,
+                                  parsed_args.window):
+            if not any(counts.values()):
+                outfp.write('--- {}\n+++ {}\n'.format(parsed_args.input_a,
+                                                       parsed_args.input_b))
+            counts[diff.kind] += 1
+            outfp.write(format_diff(diff))
+    finally:
+        outfp.close()
+
+    if any(counts.values()):
+        sys.stderr.write('{changed} changed, {removed} removed, {added} '
+                         'added bursts\n'.format(**counts))
+        return 1
+    return 0
+
+
+def map_file(fp):
+    # Empty files can't be memory mapped
+    if os.fstat(fp.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_stdin_buffered():
+    # filter_stream reads the file descriptor of stdin directly, so the
+    # input peeked at by detect_stream_compression must be taken from the
+    # buffer
+    if parsed_args.input_file:
+        return b''
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
+    if not hasattr(stdin, "peek"):
+        return b''
+    return stdin.read1(len(stdin.peek()))
+
+
+def write_stats(hf, seconds):
+    from hexfilter.stats import format_stats, write_stats_json
+
+    stats = hf.get_stats()
+    if parsed_args.stats == '-':
+        sys.stderr.write(format_stats(stats, seconds))
+    else:
+        with open(parsed_args.stats, "w") as fp:
+            write_stats_json(fp, stats, seconds)
+
+
+def filter_batch(filter_kwargs):
+    from hexfilter.batch import expand_inputs, output_paths, filter_files, \
+        format_result, format_total, default_output_template
+    import time
+
+    paths = expand_inputs(parsed_args.input_files,
+                          exclude_dir=parsed_args.output_dir)
+    outputs = output_paths(paths, parsed_args.output_dir,
+                           parsed_args.output_template or
+                           default_output_template)
+    start = time.time()
+    results = []
+    for result in filter_files(paths, outputs, parsed_args.jobs,
+                               parsed_args.format, filter_kwargs,
+                               parsed_args.payload_output,
+                               parsed_args.output_buffer_size):
+        sys.stderr.write(format_result(result) + '\n')
+        results.append(result)
+    sys.stderr.write(format_total(results, time.time() - start) + '\n')
+
+    if any(result.error is not None for result in results):
+        return 1
+    return 0
 
 
 def main():
     global parsed_args
-    load_options()
+    diff = sys.argv[1:2] == ['diff']
+    if diff:
+        load_diff_options(sys.argv[2:])
+    else:
+        load_options()
 
     try:
-        if parsed_args.input_file:
+        if diff:
+            status = diff_files()
+            if status:
+                sys.exit(status)
+            return
+
+        filter_kwargs = dict(skip_timestamps=parsed_args.skip_timestamps,
+                             abs_timestamps=parsed_args.abs_timestamps,
+                             timestamps_round_us=parsed_args.rounding,
+                             dump_desc=parsed_args.desc_str,
+                             dump_desc_invert=parsed_args.desc_str_invert,
+                             log_has_timestamps=(not parsed_args.no_timestamps),
+                             include_dump_desc_in_output=parsed_args.keep_desc_str,
+                             keep_n_lines_before_each_dump=parsed_args.keep_non_hex_before,
+                             keep_n_lines_after_each_dump=parsed_args.keep_non_hex_after,
+                             remove_ascii_part=parsed_args.skip_ascii,
+                             ftrace_format=parsed_args.ftrace,
+                             start_ts=parsed_args.start_ts,
+                             end_ts=parsed_args.end_ts)
+        if parsed_args.batch:
+            status = filter_batch(filter_kwargs)
+            if status:
+                sys.exit(status)
+            return
+
+        # Compressed data on stdin is decompressed in the same way as
+        # compressed input files
+        stdin = getattr(sys.stdin, "buffer", sys.stdin)
+        stdin_compression = None
+        if not parsed_args.input_file and not parsed_args.sources:
+            stdin_compression = detect_stream_compression(stdin)
+        if stdin_compression is not None:
+            stdin = open_compressed(stdin, stdin_compression)
+
+        format_kwargs = {}
+        # The sample of stdin read for detecting the format is put back in
+        # front of the input, see PrefixedReader
+        stdin_sample = None
+        if parsed_args.format == 'auto' and parsed_args.input_file:
+            dump_format, format_kwargs = \
+                detect_file_format(parsed_args.input_file)
+        elif parsed_args.format == 'auto':
+            stdin_sample = read_sample(stdin)
+            dump_format, format_kwargs = detect_data_format(stdin_sample)
+        else:
+            dump_format = parsed_args.format
+        filter_class = hex_dump_formats[dump_format]
+        if filter_class.multiline_dumps and (parsed_args.jobs > 1 or
+                                             parsed_args.index):
+            parser.error("The {} format can't be used with --jobs or "
+                         "--index".format(dump_format))
+
+        compressed_input = stdin_compression is not None or \
+            (parsed_args.input_file is not None and
+             detect_compression(parsed_args.input_file) is not None)
+        compressed_output = parsed_args.output_file is not None and \
+            compression_from_name(parsed_args.output_file) is not None
+        if compressed_input and (parsed_args.mmap or parsed_args.jobs > 1 or
+                                 parsed_args.follow or parsed_args.index):
+            parser.error("Compressed input can't be used with --mmap, "
+                         "--jobs, --follow or --index")
+
+        # Compressed files are filtered as bytes, see filter_input. So is
+        # stdin when a sample of it has been read
+        compressed = compressed_input or compressed_output
+        bytes_input = compressed or stdin_sample is not None
+        # Uncompressed input files are searched for the start of the time
+        # window, see find_start_offset
+        seek_start = parsed_args.start_ts is not None and \
+            parsed_args.input_file is not None and not compressed_input and \
+            not parsed_args.index and not parsed_args.follow
+        binary = parsed_args.mmap or parsed_args.jobs > 1 or \
+            parsed_args.payload_output or parsed_args.follow or \
+            parsed_args.index or seek_start or bytes_input
+        if parsed_args.jobs > 1 or parsed_args.index:
+            infp = None
+        elif parsed_args.mmap or seek_start or \
+                (parsed_args.follow and parsed_args.input_file):
+            infp = open(parsed_args.input_file, "rb")
+        elif compressed and parsed_args.input_file:
+            infp = open_input(parsed_args.input_file)
+        elif bytes_input:
+            infp = PrefixedReader(stdin_sample or b'', stdin)
+        elif parsed_args.input_file:
             infp = open(parsed_args.input_file, "r")
         else:
             infp = sys.stdin
+        buffer_size = parsed_args.output_buffer_size
         if parsed_args.output_file:
-            outfp = open(parsed_args.output_file, "w")
+            if binary:
+                outfp = open_output(parsed_args.output_file, buffer_size)
+            else:
+                outfp = open(parsed_args.output_file, "w", buffer_size)
+        else:
+            # sys.stdout has a small buffer (or is line buffered), so a
+            # separate file object with a larger buffer is used for stdout
+            outfp = os.fdopen(os.dup(sys.stdout.fileno()),
+                              "wb" if binary else "w", buffer_size)
+        filter_kwargs.update(format_kwargs)
+        if parsed_args.stats:
+            import time
+            start = time.time()
+        hf = None
+        status = 0
+        if parsed_args.sources:
+            # Imported here since asyncio is not available in Python 2
+            from hexfilter.aio import filter_sources
+            if filter_sources(parsed_args.sources, parsed_args.output_dir,
+                              filter_class, filter_kwargs):
+                status = 1
+        elif parsed_args.jobs > 1:
+            from hexfilter.parallel import filter_file_parallel
+            filter_file_parallel(parsed_args.input_file, outfp,
+                                 parsed_args.jobs,
+                                 filter_class=filter_class,
+                                 filter_kwargs=filter_kwargs)
+        elif parsed_args.follow:
+            from hexfilter.stream import filter_stream
+            hf = filter_class(**filter_kwargs)
+            if parsed_args.stats:
+                hf.enable_stage_times()
+            filter_stream(hf, infp.fileno(), outfp, follow=True,
+                          flush_interval=parsed_args.flush_interval,
+                          flush_records=parsed_args.flush_records,
+                          initial_data=(stdin_sample or b'') +
+                          read_stdin_buffered())
         else:
-            outfp = sys.stdout
-        hf = HexFilterLinux(skip_timestamps=parsed_args.skip_timestamps,
-                            abs_timestamps=parsed_args.abs_timestamps,
-                            timestamps_round_us=parsed_args.rounding,
-                            dump_desc=parsed_args.desc_str,
-                            dump_desc_invert=parsed_args.desc_str_invert,
-                            log_has_timestamps=(not parsed_args.no_timestamps),
-                            include_dump_desc_in_output=parsed_args.keep_desc_str,
-                            keep_n_lines_before_each_dump=parsed_args.keep_non_hex_before,
-                            remove_ascii_part=parsed_args.skip_ascii,
-                            ftrace_format=parsed_args.ftrace)
-        for line in infp:
-            if hf.parse_line(line):
-                if parsed_args.keep_non_hex_before > 0:
-                    before = hf.get_lines_before_hex()
-                    if before:
-                        outfp.write("%s" % (before))
-                result = hf.get_hex()
-                outfp.write("%s\n" % (result))
+            hf = filter_class(**filter_kwargs)
+            if parsed_args.stats:
+                hf.enable_stage_times()
+            get_output = None
+            if parsed_args.payload_output:
+                from hexfilter.payload import PayloadAssembler, \
+                    write_payloads_raw, write_payload_records
+                assembler = PayloadAssembler(hf)
+                get_output = assembler.add_dump
+            elif parsed_args.export:
+                get_output = hf.get_record
+            elif parsed_args.dedup:
+                from hexfilter.dedup import BurstDeduplicator
+                dedup = BurstDeduplicator(hf, parsed_args.dedup_cache_size)
+                get_output = dedup.add_dump
+            if seek_start:
+                from hexfilter.seek import find_start_offset
+
+            if parsed_args.index:
+                from hexfilter.index import open_index, filter_indexed
+                index = open_index(parsed_args.input_file, hf)
+                outputs = filter_indexed(hf, parsed_args.input_file, index,
+                                         get_output)
+            elif parsed_args.mmap:
+                data = map_file(infp)
+                start = find_start_offset(infp, hf) if seek_start else 0
+                outputs = hf.filter_bytes(data, get_output, start)
+            elif seek_start:
+                infp.seek(find_start_offset(infp, hf))
+                outputs = filter_input(hf, infp, get_output)
+            elif bytes_input:
+                outputs = filter_input(hf, infp, get_output)
+            else:
+                outputs = hf.filter_file(infp, get_output=get_output)
+
+            if parsed_args.payload_output == 'raw':
+                write_payloads_raw(outfp, assembler.payloads(outputs))
+            elif parsed_args.payload_output == 'records':
+                write_payload_records(outfp, assembler.payloads(outputs))
+            elif parsed_args.export:
+                from hexfilter.columnar import export_records
+                export_format = parsed_args.export_format
+                export_records(outputs, parsed_args.export,
+                               None if export_format == 'auto'
+                               else export_format,
+                               parsed_args.export_chunk_size)
+            elif parsed_args.dedup:
+                outputs = dedup.outputs(outputs)
+                if binary:
+                    outputs = (output.encode('utf-8') for output in outputs)
+                outfp.writelines(outputs)
+            else:
+                outfp.writelines(outputs)
+
+        # Compressed output files are not complete until closed
+        outfp.close()
+        if parsed_args.stats:
+            write_stats(hf, time.time() - start)
+        if status:
+            sys.exit(status)
 
     except IOError as err:
         sys.stderr.write('{}\n'.format(err))
-    except:
-        type, value, tb = sys.exc_info()
+    except Exception as err:
+        if not parsed_args.debug:
+            sys.stderr.write('hexfilter: {}: {}\n'.format(type(err).__name__,
+                                                          err))
+            sys.exit(1)
+        import pdb
+        import traceback
         traceback.print_exc()
-        pdb.post_mortem(tb)
+        pdb.post_mortem(sys.exc_info()[2])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import re
+import stat
+import sys
+from collections import deque
+
+from .hexfilter import HexFilterLinux
+from .stream import default_read_size
+
+
+class AsyncHexFilter(object):
+
+    """ Asynchronous iterator filtering a stream with a HexFilter.
+
+    Example:
+
+        reader, writer = await asyncio.open_connection(host, port)
+        async for output in AsyncHexFilter(reader, HexFilterLinux()):
+            outfp.write(output)
+
+    The reader can be an asyncio.StreamReader or any other object with a
+    read(n) coroutine returning bytes (and b'' at end of stream).
+    """
+
+    def __init__(self, reader, hf=None, read_size=default_read_size,
+                 get_output=None):
+        """ AsyncHexFilter constructor
+
+        Arguments:
+        reader -- Stream to filter
+
+        Keyword arguments:
+        hf         -- (HexFilter) The filter used for parsing the stream.
+                      If omitted, a HexFilterLinux with default arguments will
+                      be used (default None)
+        read_size  -- (int) Maximum number of bytes read at a time
+                      (default 64 KiB)
+        get_output -- (callable) See HexFilter.parse_lines. If omitted, the
+                      iterator will yield UTF-8 encoded output text
+                      (default None)
+        """
+        self.reader = reader
+        self.hf = hf if hf is not None else HexFilterLinux()
+        self.read_size = read_size
+        self.get_output = get_output
+        self.pending = deque()
+        self.remainder = b''
+        self.eof = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+
+        while not self.pending:
+            if self.eof:
+                raise StopAsyncIteration
+
+            data = await self.reader.read(self.read_size)
+            if not data:
+                self.eof = True
+                block = self.remainder
+                self.remainder = b''
+            else:
+                if self.remainder:
+                    data = self.remainder + data
+                line_end = data.rfind(b'\n')
+                if line_end < 0:
+                    self.remainder = data
+                    continue
+                self.remainder = data[line_end + 1:]
+                block = data[:line_end + 1]
+
+            if block:
+                self.pending.extend(self.hf.filter_bytes(block,
+                                                         self.get_output))
+
+        return self.pending.popleft()
+
+
+class _FileReader(object):
+
+    """ Reader for regular files, which can't be read asynchronously.
+    Each read gives the other streams a chance to run before the file
+    is read.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+
+    async def read(self, n):
+        await asyncio.sleep(0)
+        return self.fp.read(n)
+
+    def close(self):
+        self.fp.close()
+
+
+async def open_source(source):
+    """ Opens a source for filtering. The source can be:
+
+    tcp:HOST:PORT -- A TCP connection to HOST:PORT
+    unix:PATH     -- A connection to the UNIX socket PATH
+    PATH          -- A file, FIFO or character device (e.g. a serial port)
+
+    Returns a (reader, writer) tuple. writer is the object that should be
+    closed when done with the source (or None).
+    """
+
+    if source.startswith('tcp:'):
+        host, port = source[4:].rsplit(':', 1)
+        return await asyncio.open_connection(host, int(port))
+
+    if source.startswith('unix:'):
+        return await asyncio.open_unix_connection(source[5:])
+
+    fp = open(source, "rb")
+    if stat.S_ISREG(os.fstat(fp.fileno()).st_mode):
+        reader = _FileReader(fp)
+        return reader, reader
+
+    reader = asyncio.StreamReader()
+    loop = asyncio.get_event_loop()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), fp)
+    return reader, transport
+
+
+def output_name(source):
+    """ Returns an output file name for a source (see open_source). """
+
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', source).strip('_') + '.filtered'
+
+
+async def filter_source(source, outfp, hf):
+    """ Filters source (see open_source) with hf and writes the output to
+    outfp (opened in binary mode). The output is flushed whenever all data
+    read so far has been filtered.
+    """
+
+    reader, writer = await open_source(source)
+    try:
+        hex_filter = AsyncHexFilter(reader, hf)
+        async for output in hex_filter:
+            outfp.write(output)
+            if not hex_filter.pending:
+                outfp.flush()
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def _filter_sources(sources, output_dir, filter_class, filter_kwargs):
+
+    outfps = [open(os.path.join(output_dir, output_name(source)), "wb")
+              for source in sources]
+    try:
+        results = await asyncio.gather(
+            *[filter_source(source, outfp, filter_class(**filter_kwargs))
+              for source, outfp in zip(sources, outfps)],
+            return_exceptions=True)
+    finally:
+        for outfp in outfps:
+            outfp.close()
+
+    failed = 0
+    for source, result in zip(sources, results):
+        if isinstance(result, Exception):
+            sys.stderr.write('{}: {}\n'.format(source, result))
+            failed += 1
+    return failed
+
+
+def filter_sources(sources, output_dir, filter_class=HexFilterLinux,
+                   filter_kwargs=None):
+    """ Filters all sources (see open_source) concurrently in one event loop.
+    The output of each source is written to a separate file in output_dir
+    (see output_name). Each source is filtered by its own filter_class
+    instance created with filter_kwargs.
+
+    Errors are reported on stderr. Returns the number of failed sources.
+    """
+
+    if filter_kwargs is None:
+        filter_kwargs = {}
+
+    coro = _filter_sources(sources, output_dir, filter_class, filter_kwargs)
+    if hasattr(asyncio, 'run'):
+        return asyncio.run(coro)
+    return asyncio.get_event_loop().run_until_complete(coro)
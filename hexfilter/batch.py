@@ -0,0 +1,283 @@
+import glob
+import mmap
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+from .compress import detect_compression, filter_input, open_input, \
+    open_output
+from .formats import hex_dump_formats, detect_file_format
+from .index import index_extension
+from .payload import PayloadAssembler, write_payloads_raw, \
+    write_payload_records
+from .seek import find_start_offset
+
+# Default output path template (see output_paths)
+default_output_template = '{path}'
+
+# Result of filtering one file with filter_files.
+#
+# path        -- Input file path
+# output_path -- Output file path
+# input_size  -- Size of the input file in bytes (compressed size for
+#                compressed files)
+# output_size -- Size of the output file in bytes
+# dump_lines  -- Number of hex dump lines written to the output (i.e. lines
+#                passing all filters)
+# seconds     -- Time spent on the file in seconds
+# error       -- Error message if the file could not be filtered (or None)
+BatchResult = namedtuple('BatchResult', ['path', 'output_path', 'input_size',
+                                         'output_size', 'dump_lines',
+                                         'seconds', 'error'])
+
+
+def _is_glob(pattern):
+
+    return any(c in pattern for c in '*?[')
+
+
+def _walk(top, exclude_dir):
+
+    for root, dirs, files in os.walk(top):
+        if exclude_dir is not None:
+            dirs[:] = [d for d in dirs
+                       if os.path.realpath(os.path.join(root, d)) !=
+                       exclude_dir]
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(index_extension):
+                yield os.path.join(root, name)
+
+
+def expand_inputs(patterns, exclude_dir=None):
+    """ Returns the list of input files given by patterns. Each pattern is
+    a file path, a glob pattern or a directory. Directories are walked
+    recursively (sidecar index files are skipped, see hexfilter.index).
+
+    Files are returned in the order of the patterns (matches of glob
+    patterns and directory contents are sorted) and only once each.
+    exclude_dir (e.g. the output directory) is not walked.
+    """
+
+    if exclude_dir is not None:
+        exclude_dir = os.path.realpath(exclude_dir)
+
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        if _is_glob(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                files = _walk(match, exclude_dir)
+            else:
+                files = [match]
+            for path in files:
+                key = os.path.realpath(path)
+                if key not in seen:
+                    seen.add(key)
+                    paths.append(path)
+    return paths
+
+
+def _common_dir(paths):
+
+    dirs = [os.path.dirname(os.path.abspath(path)).split(os.sep)
+            for path in paths]
+    return os.sep.join(os.path.commonprefix(dirs)) or os.sep
+
+
+def output_paths(paths, output_dir, template=default_output_template):
+    """ Returns the output file path of each input file in paths.
+
+    The output paths mirror the directory structure of the input files below
+    their common parent directory. template is a str.format template for
+    the output path (relative to output_dir) with the fields:
+
+    path -- Path of the input file relative to the common parent directory
+    dir  -- Directory part of path
+    name -- File name of the input file
+    stem -- File name without extension
+    ext  -- Extension of the file name (including the '.')
+
+    E.g. '{dir}/{stem}.hex.gz' writes gzip compressed output next to the
+    mirrored location of each input file.
+
+    Leading separators of the formatted path are removed, since dir is empty
+    for files in the common parent directory. ValueError is raised if an
+    output path is not below output_dir.
+    """
+
+    if not paths:
+        return []
+
+    separators = os.sep + (os.altsep or '')
+    common = _common_dir(paths)
+    outputs = []
+    for path in paths:
+        rel_path = os.path.relpath(os.path.abspath(path), common)
+        rel_dir, name = os.path.split(rel_path)
+        stem, ext = os.path.splitext(name)
+        output_path = os.path.normpath(
+            template.format(path=rel_path, dir=rel_dir, name=name, stem=stem,
+                            ext=ext).lstrip(separators))
+        if os.path.isabs(output_path) or output_path == os.curdir or \
+           output_path == os.pardir or \
+           output_path.startswith(os.pardir + os.sep):
+            raise ValueError("Output path {} of {} is not below the output "
+                             "directory".format(output_path, path))
+        outputs.append(os.path.normpath(os.path.join(output_dir,
+                                                     output_path)))
+    return outputs
+
+
+def _filter_outputs(hf, fp, compressed, get_output):
+
+    if compressed:
+        for output in filter_input(hf, fp, get_output):
+            yield output
+        return
+
+    # Empty files can't be memory mapped
+    if os.fstat(fp.fileno()).st_size == 0:
+        return
+    mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        start = find_start_offset(fp, hf)
+        for output in hf.filter_bytes(mapped, get_output, start):
+            yield output
+    finally:
+        mapped.close()
+
+
+def _filter_file(args):
+
+    path, output_path, dump_format, filter_kwargs, payload_output, \
+        buffer_size = args
+    start = time.time()
+    input_size = output_size = dump_lines = 0
+    try:
+        input_size = os.path.getsize(path)
+        if os.path.realpath(path) == os.path.realpath(output_path):
+            raise IOError("{}: Output file is the same as the input "
+                          "file".format(path))
+
+        filter_kwargs = dict(filter_kwargs)
+        if dump_format == 'auto':
+            dump_format, format_kwargs = detect_file_format(path)
+            filter_kwargs.update(format_kwargs)
+        hf = hex_dump_formats[dump_format](**filter_kwargs)
+
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+
+        compressed = detect_compression(path) is not None
+        with open_input(path) as fp:
+            outfp = open_output(output_path, buffer_size)
+            try:
+                if payload_output:
+                    assembler = PayloadAssembler(hf)
+                    payloads = assembler.payloads(
+                        _filter_outputs(hf, fp, compressed,
+                                        assembler.add_dump))
+                    if payload_output == 'raw':
+                        write_payloads_raw(outfp, payloads)
+                    else:
+                        write_payload_records(outfp, payloads)
+                else:
+                    outfp.writelines(_filter_outputs(hf, fp, compressed,
+                                                     None))
+            finally:
+                outfp.close()
+
+        output_size = os.path.getsize(output_path)
+        dump_lines = hf.dumps_passed
+        error = None
+    except (IOError, OSError, ValueError, EOFError) as err:
+        error = str(err)
+
+    return BatchResult(path, output_path, input_size, output_size,
+                       dump_lines, time.time() - start, error)
+
+
+def filter_files(paths, outputs, jobs=1, dump_format='linux',
+                 filter_kwargs=None, payload_output=None, buffer_size=-1):
+    """ Filters each file in paths to the corresponding file in outputs
+    (see output_paths) and yields a BatchResult for each file, in the order
+    of paths.
+
+    Each file is filtered by its own filter instance, so the files are
+    independent of each other. With jobs > 1, the files are filtered by a
+    pool of jobs worker processes. A file that can't be filtered doesn't
+    stop the batch, the error is reported in its BatchResult.
+
+    Keyword arguments:
+    jobs           -- (int) Number of worker processes (default 1, filter
+                      the files in this process)
+    dump_format    -- (string) Name of the dump format (see
+                      hexfilter.formats.hex_dump_formats) or 'auto' for
+                      detecting the format of each file (default 'linux')
+    filter_kwargs  -- (dict) Constructor arguments for the filters
+                      (default None)
+    payload_output -- (string) Write binary payloads instead of text, 'raw'
+                      or 'records' (see hexfilter.payload) (default None)
+    buffer_size    -- (int) Buffer size of the output files
+                      (default -1, the default buffer size)
+    """
+
+    if filter_kwargs is None:
+        filter_kwargs = {}
+
+    tasks = [(path, output_path, dump_format, filter_kwargs, payload_output,
+              buffer_size) for path, output_path in zip(paths, outputs)]
+
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _filter_file(task)
+        return
+
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        for result in pool.imap(_filter_file, tasks):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _throughput(size, seconds):
+
+    if seconds <= 0:
+        return 0.0
+    return size / seconds / 1e6
+
+
+def format_result(result):
+    """ Returns a summary line of a BatchResult. """
+
+    if result.error is not None:
+        return '{}: FAILED: {}'.format(result.path, result.error)
+    return '{}: {:.2f} MB in {:.3f} s ({:.1f} MB/s), {} dump lines -> ' \
+        '{}'.format(result.path, result.input_size / 1e6, result.seconds,
+                    _throughput(result.input_size, result.seconds),
+                    result.dump_lines, result.output_path)
+
+
+def format_total(results, seconds):
+    """ Returns a summary line of all results of a batch that took seconds
+    (wall clock time). """
+
+    failed = sum(1 for result in results if result.error is not None)
+    input_size = sum(result.input_size for result in results)
+    dump_lines = sum(result.dump_lines for result in results)
+    return 'Total: {} files ({} failed), {:.2f} MB in {:.3f} s ' \
+        '({:.1f} MB/s), {} dump lines'.format(
+            len(results), failed, input_size / 1e6, seconds,
+            _throughput(input_size, seconds), dump_lines)
@@ -0,0 +1,346 @@
+# hexfilter.decode and the modules only needed by some formats (pyarrow and
+# numpy) are imported when they are first used, so that importing this module
+# (done by the command line tool) is fast.
+import os
+import sys
+from array import array
+from itertools import islice
+
+# Default number of records written at a time (one Parquet row group or
+# Arrow record batch per chunk)
+default_chunk_size = 1 << 16
+
+# Export formats, see open_export
+export_formats = ('parquet', 'arrow', 'npz', 'raw')
+
+# File name extensions of the export formats (see export_format_from_name)
+_export_extensions = {
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.npz': 'npz',
+}
+
+# Fixed size columns of the raw (and NPZ) layout: column name, array typecode
+# and NumPy dtype. All values are little endian.
+#
+# ts      -- Absolute log timestamp (NaN if not available)
+# ts_diff -- Delta time to the previous dump (NaN if not available)
+# addr    -- Address/offset of the dump line
+# desc    -- Index of the description string in descs.json
+# offsets -- Start of the payload of each record in data.bin, followed by
+#            the total size of data.bin (one more entry than records)
+raw_columns = (
+    ('ts', 'd', '<f8'),
+    ('ts_diff', 'd', '<f8'),
+    ('addr', 'Q', '<u8'),
+    ('desc', 'I', '<u4'),
+    ('offsets', 'q', '<i8'),
+)
+
+
+def _pyarrow():
+
+    try:
+        import pyarrow
+    except ImportError:
+        raise IOError("The pyarrow module is required for Parquet and Arrow "
+                      "files")
+    return pyarrow
+
+
+def _numpy():
+
+    try:
+        import numpy
+    except ImportError:
+        raise IOError("The numpy module is required for .npz files")
+    return numpy
+
+
+def _available(module):
+
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def export_format_from_name(path):
+    """ Returns the export format of path given by its extension. If the
+    extension is unknown, the best available format is returned: 'parquet'
+    if pyarrow is installed, otherwise 'npz' if numpy is installed and 'raw'
+    if neither is.
+    """
+
+    export_format = _export_extensions.get(os.path.splitext(path)[1].lower())
+    if export_format is not None:
+        return export_format
+    if _available('pyarrow'):
+        return 'parquet'
+    if _available('numpy'):
+        return 'npz'
+    return 'raw'
+
+
+def _payloads(records):
+    """ Returns the payload bytes and offsets (see decode_records) of the
+    records. Records with hex data that can't be converted get an empty
+    payload.
+    """
+
+    from .decode import decode_records
+
+    try:
+        return decode_records(records)
+    except ValueError:
+        pass
+
+    payloads = [record.get_bytes() or b'' for record in records]
+    offsets = [0]
+    for payload in payloads:
+        offsets.append(offsets[-1] + len(payload))
+    return bytearray(b''.join(payloads)), offsets
+
+
+class _ArrowWriter(object):
+
+    """ Writes records to a Parquet file (one row group per chunk) or an
+    Arrow IPC file (one record batch per chunk). """
+
+    def __init__(self, path, export_format):
+
+        pa = _pyarrow()
+        self.pa = pa
+        self.schema = pa.schema([
+            ('ts', pa.float64()),
+            ('ts_diff', pa.float64()),
+            ('desc', pa.string()),
+            ('addr', pa.uint64()),
+            ('data', pa.binary()),
+        ])
+        self.parquet = export_format == 'parquet'
+        if self.parquet:
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, records):
+
+        pa = self.pa
+        data, offsets = _payloads(records)
+        payload_column = pa.Array.from_buffers(
+            pa.binary(), len(records),
+            [None, pa.py_buffer(array('i', offsets).tobytes()),
+             pa.py_buffer(bytes(data))])
+        batch = pa.RecordBatch.from_arrays([
+            pa.array([record.ts for record in records], pa.float64()),
+            pa.array([record.ts_diff for record in records], pa.float64()),
+            pa.array([record.desc for record in records], pa.string()),
+            pa.array([record.addr for record in records], pa.uint64()),
+            payload_column,
+        ], schema=self.schema)
+        if self.parquet:
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+
+    def close(self):
+
+        self.writer.close()
+
+
+class _RawWriter(object):
+
+    """ Writes records to a directory with one file per column (see
+    raw_columns), data.bin with the payload bytes of all records, descs.json
+    with the description strings and columns.json describing the files.
+    Each chunk is appended to the column files, so the files can be read
+    with e.g. numpy.fromfile.
+    """
+
+    def __init__(self, path):
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.files = dict((name, open(os.path.join(path, name + '.bin'),
+                                      "wb"))
+                          for name, _, _ in raw_columns)
+        self.data_file = open(os.path.join(path, 'data.bin'), "wb")
+        self.descs = {}
+        self.num_records = 0
+        self.data_size = 0
+        self.__write_column('offsets', [0])
+
+    def __write_column(self, name, values):
+
+        typecode = [column[1] for column in raw_columns
+                    if column[0] == name][0]
+        values = array(typecode, values)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        values.tofile(self.files[name])
+
+    def write(self, records):
+
+        nan = float('nan')
+        descs = self.descs
+        data, offsets = _payloads(records)
+
+        self.__write_column('ts', [nan if record.ts is None else record.ts
+                                   for record in records])
+        self.__write_column('ts_diff', [nan if record.ts_diff is None
+                                        else record.ts_diff
+                                        for record in records])
+        self.__write_column('addr', [record.addr for record in records])
+        self.__write_column('desc', [descs.setdefault(record.desc,
+                                                      len(descs))
+                                     for record in records])
+        self.__write_column('offsets', [self.data_size + offset
+                                        for offset in offsets[1:]])
+        self.data_file.write(data)
+
+        self.num_records += len(records)
+        self.data_size += len(data)
+
+    def close(self):
+
+        import json
+
+        for fp in self.files.values():
+            fp.close()
+        self.data_file.close()
+
+        descs = sorted(self.descs, key=self.descs.get)
+        with open(os.path.join(self.path, 'descs.json'), "w") as fp:
+            json.dump(descs, fp)
+        columns = dict((name, {'file': name + '.bin', 'dtype': dtype})
+                       for name, _, dtype in raw_columns)
+        columns['data'] = {'file': 'data.bin', 'dtype': '|u1'}
+        with open(os.path.join(self.path, 'columns.json'), "w") as fp:
+            json.dump({'records': self.num_records, 'columns': columns}, fp,
+                      indent=2, sort_keys=True)
+
+
+class _NpzWriter(object):
+
+    """ Writes records to a NumPy .npz file with one array per column of the
+    raw layout (see raw_columns), 'data' with the payload bytes of all
+    records and 'descs' with the description strings.
+
+    The chunks are written to a temporary raw directory next to the output
+    file, which is packed into the .npz file when the writer is closed.
+    """
+
+    def __init__(self, path):
+
+        import tempfile
+
+        self.numpy = _numpy()
+        self.path = path
+        self.tmp_dir = tempfile.mkdtemp(
+            prefix='.hexfilter-', dir=os.path.dirname(os.path.abspath(path)))
+        self.raw = _RawWriter(self.tmp_dir)
+
+    def write(self, records):
+
+        self.raw.write(records)
+
+    def __write_array_file(self, zip_file, name, dtype, src):
+
+        import shutil
+
+        numpy = self.numpy
+        dtype = numpy.dtype(dtype)
+        shape = (os.path.getsize(src) // dtype.itemsize,)
+        with zip_file.open(name + '.npy', "w", force_zip64=True) as fp:
+            numpy.lib.format.write_array_header_1_0(
+                fp, {'descr': numpy.lib.format.dtype_to_descr(dtype),
+                     'fortran_order': False, 'shape': shape})
+            with open(src, "rb") as src_fp:
+                shutil.copyfileobj(src_fp, fp)
+
+    def close(self):
+
+        import shutil
+        import zipfile
+
+        try:
+            self.raw.close()
+            with zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED,
+                                 allowZip64=True) as zip_file:
+                for name, _, dtype in raw_columns:
+                    self.__write_array_file(
+                        zip_file, name, dtype,
+                        os.path.join(self.tmp_dir, name + '.bin'))
+                self.__write_array_file(
+                    zip_file, 'data', '|u1',
+                    os.path.join(self.tmp_dir, 'data.bin'))
+                descs = sorted(self.raw.descs, key=self.raw.descs.get)
+                with zip_file.open('descs.npy', "w") as fp:
+                    self.numpy.lib.format.write_array(
+                        fp, self.numpy.array(descs, dtype=str),
+                        allow_pickle=False)
+        finally:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def open_export(path, export_format=None):
+    """ Opens path for exporting records in a columnar format and returns a
+    writer with the methods write(records), writing a chunk (list) of
+    HexDumpRecord, and close().
+
+    Each record is one row with the columns ts (absolute timestamp), ts_diff
+    (delta timestamp), desc (description), addr (address) and data (payload
+    bytes of the dump line). Missing timestamps are null (Arrow/Parquet) or
+    NaN (NPZ and raw).
+
+    Formats:
+    parquet -- Parquet file, one row group per chunk (requires pyarrow)
+    arrow   -- Arrow IPC file, one record batch per chunk (requires pyarrow)
+    npz     -- NumPy .npz file (requires numpy). The payloads are stored as
+               one 'data' array with 'offsets' (see raw_columns) and the
+               descriptions as indexes into the 'descs' array.
+    raw     -- Directory with one little endian binary file per column, in
+               the same layout as npz (no dependencies)
+
+    If export_format is None, the format is given by the extension of path
+    (see export_format_from_name).
+    """
+
+    if export_format is None:
+        export_format = export_format_from_name(path)
+    if export_format in ('parquet', 'arrow'):
+        return _ArrowWriter(path, export_format)
+    if export_format == 'npz':
+        return _NpzWriter(path)
+    if export_format == 'raw':
+        return _RawWriter(path)
+    raise ValueError("Unknown export format: {}".format(export_format))
+
+
+def export_records(records, path, export_format=None,
+                   chunk_size=default_chunk_size):
+    """ Exports records (an iterable of HexDumpRecord, e.g. from
+    HexFilter.parse_records) to path in chunks of chunk_size records, see
+    open_export. Only one chunk is held in memory at a time.
+
+    Returns the number of exported records.
+    """
+
+    writer = open_export(path, export_format)
+    records = iter(records)
+    num_records = 0
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            writer.write(chunk)
+            num_records += len(chunk)
+    finally:
+        writer.close()
+    return num_records
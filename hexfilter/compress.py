@@ -0,0 +1,241 @@
+# The compression and threading modules are imported when they are first
+# used, so that detecting the compression of a file (done for every input
+# file of the command line tool) doesn't slow down the startup.
+import os
+
+# Number of bytes read in each read call by threaded_chunks
+default_read_size = 1 << 20
+
+# Maximum number of chunks read ahead by the background reader thread
+default_read_ahead = 4
+
+# Magic bytes at the start of compressed files
+_compression_magics = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'BZh', 'bz2'),
+)
+
+# File name extensions used for selecting the compression of output files
+_compression_extensions = {
+    '.gz': 'gzip',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+    '.bz2': 'bz2',
+}
+
+
+def _magic_compression(magic):
+
+    for compression_magic, compression in _compression_magics:
+        if magic.startswith(compression_magic):
+            return compression
+    return None
+
+
+def detect_compression(path):
+    """ Returns the compression format ('gzip', 'xz', 'zstd' or 'bz2') of the
+    file path, based on the magic bytes at the start of the file. Returns None
+    if the file is not compressed (or not a regular file).
+    """
+
+    if not os.path.isfile(path):
+        return None
+
+    with open(path, "rb") as fp:
+        return _magic_compression(fp.read(6))
+
+
+def detect_stream_compression(fp):
+    """ Same as detect_compression, but for a buffered file object opened in
+    binary mode (e.g. sys.stdin.buffer). The magic bytes are inspected with
+    peek, so no input is consumed. Returns None if fp can't be peeked.
+    """
+
+    if not hasattr(fp, "peek"):
+        return None
+    return _magic_compression(fp.peek(6)[:6])
+
+
+def compression_from_name(path):
+    """ Returns the compression format to use for the file path, based on its
+    extension. Returns None for uncompressed files.
+    """
+
+    return _compression_extensions.get(os.path.splitext(path)[1].lower())
+
+
+def _lzma():
+
+    try:
+        import lzma
+    except ImportError:
+        # Python 2
+        raise IOError("The lzma module is required for .xz files")
+    return lzma
+
+
+def _zstandard():
+
+    try:
+        import zstandard
+    except ImportError:
+        raise IOError("The zstandard module is required for .zst files")
+    return zstandard
+
+
+def open_compressed(path, compression, mode="rb"):
+    """ Opens the compressed file path in binary mode ("rb" or "wb"). path
+    can also be a file object opened in binary mode (e.g. sys.stdin.buffer),
+    which is then decompressed or compressed by the returned file object
+    (Python 3 only).
+    """
+
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(path, mode)
+    if compression == 'bz2':
+        import bz2
+        return bz2.BZ2File(path, mode)
+    if compression == 'xz':
+        return _lzma().open(path, mode)
+    if compression == 'zstd':
+        zstandard = _zstandard()
+        fp = path if hasattr(path, "fileno") else open(path, mode)
+        if mode == "wb":
+            return zstandard.ZstdCompressor().stream_writer(fp)
+        decompressor = zstandard.ZstdDecompressor()
+        try:
+            return decompressor.stream_reader(fp, read_across_frames=True)
+        except TypeError:
+            # Older zstandard versions can only read one frame
+            return decompressor.stream_reader(fp)
+    raise ValueError("Unknown compression: {}".format(compression))
+
+
+def open_input(path):
+    """ Opens the input file path for reading in binary mode. If the file is
+    compressed, the returned file object will decompress it.
+    """
+
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, "rb")
+    return open_compressed(path, compression, "rb")
+
+
+def open_output(path, buffer_size=-1):
+    """ Opens the output file path for writing in binary mode. If the file
+    name has the extension of a compressed format, the returned file object
+    will compress the output. The file must be closed in order to get a
+    complete compressed file.
+
+    buffer_size is the buffer size of uncompressed files (default -1, the
+    default buffer size).
+    """
+
+    compression = compression_from_name(path)
+    if compression is None:
+        return open(path, "wb", buffer_size)
+    return open_compressed(path, compression, "wb")
+
+
+class PrefixedReader(object):
+
+    """ File object (opened in binary mode) returning prefix followed by the
+    data read from fp. Used for putting back data already read from a file
+    that can't be seeked, e.g. the sample of stdin used for detecting the
+    dump format.
+    """
+
+    def __init__(self, prefix, fp):
+        """ PrefixedReader constructor
+
+        Arguments:
+        prefix -- (bytes) Data returned before the data of fp
+        fp     -- (file) File object opened in binary mode
+        """
+        self.prefix = prefix
+        self.fp = fp
+
+    def read(self, size=-1):
+
+        if not self.prefix:
+            return self.fp.read(size)
+        if size is None or size < 0:
+            data = self.prefix + self.fp.read()
+            self.prefix = b''
+            return data
+        data = self.prefix[:size]
+        self.prefix = self.prefix[size:]
+        return data
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    def close(self):
+        self.fp.close()
+
+
+def threaded_chunks(fp, read_size=default_read_size,
+                    read_ahead=default_read_ahead):
+    """ Reads fp (opened in binary mode) in a background thread and yields the
+    read chunks of data.
+
+    Decompression (and file I/O) releases the GIL, so the input will be
+    decompressed while the chunks already read are being filtered.
+    """
+
+    import threading
+    try:
+        import queue
+    except ImportError:
+        # Python 2
+        import Queue as queue
+
+    chunks = queue.Queue(read_ahead)
+
+    def reader():
+        try:
+            while True:
+                data = fp.read(read_size)
+                chunks.put(data)
+                if not data:
+                    break
+        except Exception as err:
+            if not isinstance(err, (IOError, OSError)):
+                # E.g. EOFError for truncated gzip files
+                err = IOError(str(err))
+            chunks.put(err)
+
+    thread = threading.Thread(target=reader)
+    # Don't keep the process alive if the chunks are not consumed
+    thread.daemon = True
+    thread.start()
+
+    while True:
+        data = chunks.get()
+        if isinstance(data, Exception):
+            raise data
+        if not data:
+            break
+        yield data
+
+    thread.join()
+
+
+def filter_input(hf, fp, get_output=None):
+    """ Reads fp (opened in binary mode, e.g. by open_input) in a background
+    thread (see threaded_chunks) and yields the output of hf.filter_bytes for
+    each block of complete lines. Reading stops when the end of the time
+    window of hf has been passed (see HexFilter end_ts).
+    """
+
+    from .stream import read_lines
+
+    for block in read_lines(threaded_chunks(fp)):
+        for output in hf.filter_bytes(block, get_output):
+            yield output
+        if hf.end_ts_passed:
+            break
@@ -0,0 +1,42 @@
+def _join(datas):
+    """ Joins all hex data strings so they can be decoded in one call. The
+    strings are joined with a space, so a string with an odd number of hex
+    digits is an error (in bytearray.fromhex) even if the next string would
+    complete the last byte.
+    """
+
+    return ' '.join(datas)
+
+
+def decode_hex(datas):
+    """ Decodes a list of hex data strings (the hex part of dump lines, e.g.
+    '06 00 00 00') into one contiguous buffer of bytes.
+
+    Returns (data, offsets), where data is a bytearray and offsets a list,
+    so that the bytes of datas[i] are data[offsets[i]:offsets[i + 1]]. All
+    strings are decoded by a single bytearray.fromhex call, instead of one
+    call per string. data can be used as a NumPy uint8 array without copying
+    it (numpy.frombuffer).
+
+    Multi byte groups are decoded in the order they appear, in the same way
+    as by HexFilterLinux.get_hex_bytes. ValueError is raised if a string
+    contains a character that is neither a hex digit nor a space, or if
+    the hex digits of a string can't be paired into bytes.
+    """
+
+    data = bytearray.fromhex(_join(datas))
+
+    offsets = [0]
+    offset = 0
+    for hex_data in datas:
+        offset += (len(hex_data) - hex_data.count(' ')) >> 1
+        offsets.append(offset)
+    return data, offsets
+
+
+def decode_records(records):
+    """ Decodes the hex data of a list of HexDumpRecord (see
+    HexFilter.parse_records) into one buffer of bytes, see decode_hex.
+    """
+
+    return decode_hex([record.data for record in records])
@@ -0,0 +1,179 @@
+# hashlib is imported when a BurstDeduplicator is created, since importing it
+# takes longer than starting the command line tool without --dedup.
+from collections import OrderedDict
+
+from .payload import PayloadAssembler
+
+# Default number of distinct bursts remembered by BurstDeduplicator
+default_dedup_cache_size = 4096
+
+
+class BurstDeduplicator(object):
+
+    """ Removes repeated bursts of hex dump lines from the filtered output.
+
+    Bursts are formed in the same way as by PayloadAssembler, i.e. dump lines
+    with the same description and contiguous addresses. The output text of
+    a burst is held back until the burst is complete. The first occurrence of
+    a burst is output as is. A burst with the same description, address and
+    data as a burst output earlier is replaced by a line referring to the
+    output line of the first dump line of the first occurrence, e.g.
+
+    == repeat of line 120 (246 bytes) x 37
+
+    Consecutive repeats of the same burst are merged into one reference line
+    with a repeat count. Dump lines whose hex data can't be converted to
+    bytes are compared by their hex text. The non hex lines stored before the
+    dumps of a replaced burst (see keep_n_lines_before_each_dump) are output
+    before the reference line, so repeats separated by such lines are not
+    merged. Only the hashes of the cache_size most recently seen bursts are
+    kept (least recently used are dropped first), so the memory usage is
+    bounded on endless streams. A burst whose first occurrence has been
+    dropped from the cache is output again.
+    """
+
+    def __init__(self, hf, cache_size=default_dedup_cache_size):
+        """ BurstDeduplicator constructor
+
+        Arguments:
+        hf -- (HexFilterLinux) The filter used for parsing the log
+
+        Keyword arguments:
+        cache_size -- (int) Number of distinct bursts to remember
+                      (default 4096)
+        """
+        import hashlib
+
+        self.hf = hf
+        self.sha1 = hashlib.sha1
+        self.cache_size = cache_size
+        self.assembler = PayloadAssembler(hf)
+        # Burst key -> output line number of the first occurrence
+        self.seen = OrderedDict()
+        # Output text of the current burst
+        self.texts = []
+        # Non hex lines stored before the dumps of the current burst
+        self.context = []
+        # Dump lines of the current burst that can't be converted to bytes
+        self.invalid_rows = []
+        # Number of output lines so far
+        self.num_lines = 0
+        # Pending repeat: [line number, size in bytes, count]
+        self.repeat = None
+        # Number of bursts replaced by reference lines
+        self.num_repeats = 0
+
+    def add_dump(self):
+        """ Adds the most recently parsed hex dump of the filter.
+
+        Returns the output text of the previous burst (or the reference line
+        replacing it) if the dump starts a new burst, otherwise None.
+
+        This method can be used as the get_output argument of the filter
+        methods (parse_lines, filter_buffer etc.).
+        """
+
+        hf = self.hf
+        data = hf.get_hex_bytes()
+        payload = self.assembler.add_data(data)
+        before = None
+        if hf.keep_n_lines_before_each_dump > 0:
+            before = hf.get_lines_before_hex()
+        text = hf.get_hex() + '\n'
+        output = None
+        if payload is not None:
+            output = self.__burst_output(payload)
+        if data is None:
+            self.invalid_rows.append('%s%s: %s\n' % (hf.cur_dump_desc,
+                                                     hf.dump_addr,
+                                                     hf.dump_data))
+        if before:
+            self.context.append(before)
+            text = before + text
+        self.texts.append(text)
+        return output
+
+    def flush(self):
+        """ Returns the output text of the current burst and any pending
+        reference line (or None if there is no such output).
+        """
+
+        payload = self.assembler.flush()
+        output = None
+        if payload is not None:
+            output = self.__burst_output(payload)
+        if self.repeat is not None:
+            output = (output or '') + self.__repeat_line()
+        if self.texts:
+            # Dump lines that can't be converted, without a burst
+            output = (output or '') + self.__take_text()
+        return output
+
+    def outputs(self, outputs):
+        """ Yields all output from outputs (the output of a filter method
+        using add_dump as get_output) followed by the output of the last
+        burst.
+        """
+
+        for output in outputs:
+            yield output
+
+        output = self.flush()
+        if output is not None:
+            yield output
+
+    def __repeat_line(self):
+
+        line, size, count = self.repeat
+        self.repeat = None
+        self.num_lines += 1
+        return '== repeat of line %d (%d bytes) x %d\n' % (line, size, count)
+
+    def __take_text(self):
+
+        text = ''.join(self.texts)
+        self.texts = []
+        self.context = []
+        self.invalid_rows = []
+        self.num_lines += text.count('\n')
+        return text
+
+    def __burst_key(self, payload):
+
+        sha1 = self.sha1(payload.data)
+        for row in self.invalid_rows:
+            sha1.update(row.encode('utf-8'))
+        return (payload.desc, payload.addr, len(payload.data),
+                len(self.invalid_rows), sha1.digest())
+
+    def __burst_output(self, payload):
+
+        key = self.__burst_key(payload)
+        seen = self.seen
+        line = seen.pop(key, None)
+        if line is not None:
+            # Move to the most recently used end
+            seen[key] = line
+            self.num_repeats += 1
+            context = ''.join(self.context)
+            self.texts = []
+            self.context = []
+            self.invalid_rows = []
+            if not context and self.repeat is not None and \
+               self.repeat[0] == line:
+                self.repeat[2] += 1
+                return None
+            output = self.__repeat_line() if self.repeat is not None else ''
+            self.num_lines += context.count('\n')
+            self.repeat = [line, len(payload.data), 1]
+            return output + context or None
+
+        output = ''
+        if self.repeat is not None:
+            output = self.__repeat_line()
+        # The first dump line of the burst follows the non hex lines stored
+        # before it
+        seen[key] = self.num_lines + self.texts[0].count('\n')
+        if len(seen) > self.cache_size:
+            seen.popitem(last=False)
+        return output + self.__take_text()
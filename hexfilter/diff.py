@@ -0,0 +1,201 @@
+from collections import deque, namedtuple
+from itertools import islice
+
+from .compress import filter_input, open_input
+from .formats import hex_dump_formats, detect_file_format
+from .payload import PayloadAssembler
+
+# Default number of bursts buffered on each side when looking for the point
+# where two diverging streams are in sync again (see diff_payloads)
+default_diff_window = 256
+
+# Number of payload bytes per row in the output of format_diff
+diff_row_size = 16
+
+# A difference between two streams of payloads (see diff_payloads).
+#
+# kind -- 'changed' (same description and address, different data),
+#         'removed' (burst only in the first stream) or 'added' (burst only
+#         in the second stream)
+# a    -- HexPayload of the first stream (None for 'added')
+# b    -- HexPayload of the second stream (None for 'removed')
+DumpDiff = namedtuple('DumpDiff', ['kind', 'a', 'b'])
+
+
+def _position(payload):
+
+    return payload.desc, payload.addr
+
+
+def _content(payload):
+
+    return payload.desc, payload.addr, payload.data
+
+
+def _resync(buf_a, buf_b, key):
+    """ Returns (i, j) with the smallest i + j such that key(buf_a[i]) ==
+    key(buf_b[j]), or None if there is no such pair.
+    """
+
+    first_b = {}
+    for j, payload in enumerate(buf_b):
+        first_b.setdefault(key(payload), j)
+
+    best = None
+    for i, payload in enumerate(buf_a):
+        if best is not None and i >= sum(best):
+            break
+        j = first_b.get(key(payload))
+        if j is not None and (best is None or i + j < sum(best)):
+            best = (i, j)
+    return best
+
+
+def diff_payloads(payloads_a, payloads_b, window=default_diff_window):
+    """ Compares two iterables of HexPayload (e.g. from
+    hexfilter.payload.iter_payloads) and yields a DumpDiff for each burst
+    that differs.
+
+    Bursts are compared by description, address and data. Timestamps are
+    ignored, so timing jitter between two captures doesn't show up as a
+    difference.
+
+    Both iterables are consumed in lockstep. When the streams diverge, up to
+    window bursts of each side are buffered in order to find the next burst
+    found in both streams, first by content and then by position
+    (description and address). The bursts skipped on the way are reported
+    as changed (same position), removed or added. Hence, at most 2 * window
+    bursts are held in memory regardless of the length of the streams.
+    """
+
+    iter_a = iter(payloads_a)
+    iter_b = iter(payloads_b)
+    buf_a = deque()
+    buf_b = deque()
+
+    while True:
+        if not buf_a:
+            buf_a.extend(islice(iter_a, 1))
+        if not buf_b:
+            buf_b.extend(islice(iter_b, 1))
+        if not buf_a or not buf_b:
+            break
+
+        a = buf_a[0]
+        b = buf_b[0]
+        if a.data == b.data and a.addr == b.addr and a.desc == b.desc:
+            buf_a.popleft()
+            buf_b.popleft()
+            continue
+
+        buf_a.extend(islice(iter_a, window - len(buf_a)))
+        buf_b.extend(islice(iter_b, window - len(buf_b)))
+        skip = _resync(buf_a, buf_b, _content) or \
+            _resync(buf_a, buf_b, _position) or (1, 1)
+        if skip == (0, 0):
+            # Same position, different data
+            skip = (1, 1)
+
+        skip_a, skip_b = skip
+        while skip_a > 0 and skip_b > 0:
+            a = buf_a.popleft()
+            b = buf_b.popleft()
+            if _position(a) == _position(b):
+                yield DumpDiff('changed', a, b)
+            else:
+                yield DumpDiff('removed', a, None)
+                yield DumpDiff('added', None, b)
+            skip_a -= 1
+            skip_b -= 1
+        for _ in range(skip_a):
+            yield DumpDiff('removed', buf_a.popleft(), None)
+        for _ in range(skip_b):
+            yield DumpDiff('added', None, buf_b.popleft())
+
+    for payload in buf_a:
+        yield DumpDiff('removed', payload, None)
+    for payload in iter_a:
+        yield DumpDiff('removed', payload, None)
+    for payload in buf_b:
+        yield DumpDiff('added', None, payload)
+    for payload in iter_b:
+        yield DumpDiff('added', None, payload)
+
+
+def iter_file_payloads(path, dump_format='linux', filter_kwargs=None):
+    """ Filters the file path (which may be compressed, see
+    hexfilter.compress) and yields a HexPayload for each burst of hex dumps.
+
+    The file is read in blocks, so only the burst being assembled is held in
+    memory.
+
+    Keyword arguments:
+    dump_format   -- (string) Name of the dump format (see
+                     hexfilter.formats.hex_dump_formats) or 'auto' for
+                     detecting the format of the file (default 'linux')
+    filter_kwargs -- (dict) Constructor arguments for the filter
+                     (default None)
+    """
+
+    filter_kwargs = dict(filter_kwargs or {})
+    if dump_format == 'auto':
+        dump_format, format_kwargs = detect_file_format(path)
+        filter_kwargs.update(format_kwargs)
+    hf = hex_dump_formats[dump_format](**filter_kwargs)
+    assembler = PayloadAssembler(hf)
+
+    with open_input(path) as fp:
+        for payload in assembler.payloads(
+                filter_input(hf, fp, assembler.add_dump)):
+            yield payload
+
+
+def _format_rows(prefix, addr, data, rows=None):
+
+    lines = []
+    for offset in range(0, len(data), diff_row_size):
+        if rows is not None and offset not in rows:
+            continue
+        row = bytearray(data[offset:offset + diff_row_size])
+        lines.append('%s%08x: %s\n' % (prefix, addr + offset,
+                                       ' '.join('%02x' % c for c in row)))
+    return lines
+
+
+def _format_ts(payload):
+
+    if payload.ts is None:
+        return ''
+    return ' [%.6f]' % payload.ts
+
+
+def format_diff(diff):
+    """ Returns the text of a DumpDiff: a header line with the description,
+    address and timestamps of the burst(s) followed by the differing rows of
+    data. Rows of the first stream start with '-' and rows of the second
+    stream with '+'. Rows that are equal in both bursts are left out.
+    """
+
+    payload = diff.a if diff.a is not None else diff.b
+    desc = payload.desc.strip()
+    header = '@@ %s%08x %s' % (desc + ' ' if desc else '',
+                               payload.addr, diff.kind)
+
+    if diff.kind == 'removed':
+        return ''.join([header + _format_ts(diff.a) + '\n'] +
+                       _format_rows('-', diff.a.addr, diff.a.data))
+    if diff.kind == 'added':
+        return ''.join([header + _format_ts(diff.b) + '\n'] +
+                       _format_rows('+', diff.b.addr, diff.b.data))
+
+    a = diff.a.data
+    b = diff.b.data
+    rows = set(offset
+               for offset in range(0, max(len(a), len(b)), diff_row_size)
+               if a[offset:offset + diff_row_size] !=
+               b[offset:offset + diff_row_size])
+    header += '%s ->%s (%d -> %d bytes)\n' % (_format_ts(diff.a),
+                                              _format_ts(diff.b),
+                                              len(a), len(b))
+    return ''.join([header] + _format_rows('-', diff.a.addr, a, rows) +
+                   _format_rows('+', diff.b.addr, b, rows))
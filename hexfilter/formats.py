@@ -0,0 +1,392 @@
+import re
+from collections import OrderedDict
+
+from .compress import open_input
+from .hexfilter import HexFilter, HexFilterLinux, decode_line
+
+##
+# xxd definitions:
+
+# Sample string:
+# 00000000: 0600 0000 4412 0000 0800 0000 0000 0000  ....D...........
+xxd_hex_dump_regex_pattern = '()([0-9a-f]{8}):\s(.+)'
+
+##
+# hexdump -C definitions:
+
+# Sample string:
+# 00000000  06 00 00 00 44 12 00 00  08 00 00 00 00 00 00 00  |....D...........|
+hexdump_hex_dump_regex_pattern = '()([0-9a-f]{8})  (.+)'
+hexdump_hex_dump_marker_regex_pattern = '  (?<=[0-9a-f]{8}  )'
+# Address line ending the dump (the length of the dumped data)
+hexdump_end_address_regex_pattern = '([0-9a-f]{8})\s*$'
+
+##
+# od -A x -t x1z definitions:
+
+# Sample string:
+# 000000 06 00 00 00 44 12 00 00 08 00 00 00 00 00 00 00  >....D...........<
+od_hex_dump_regex_pattern = '()([0-9a-f]{6,}) (.+)'
+od_hex_dump_marker_regex_pattern = ' (?<=[0-9a-f]{6} )'
+od_end_address_regex_pattern = '([0-9a-f]{6,})\s*$'
+
+##
+# U-Boot md.b definitions:
+
+# Sample strings (32 and 64 bit addresses):
+# 80000000: 06 00 00 00 44 12 00 00 08 00 00 00 00 00 00 00    ....D...........
+# 0000000080000000: 06 00 00 00 44 12 00 00 08 00 00 00 00 00 00 00    ....D...........
+uboot_hex_dump_regex_pattern = '()([0-9a-f]{16}|[0-9a-f]{8}):\s(.+)'
+
+##
+# Zephyr LOG_HEXDUMP definitions:
+
+# A Zephyr hex dump consists of a log message header line followed by the
+# dump lines. The dump lines have no address, the address is the offset from
+# the start of the dump.
+# Sample strings (with and without timestamp):
+# [00:00:07.852,404] <dbg> sdio: sdio wr
+#                                         06 00 00 00 44 12 00 00  08 00 00 00 00 00 00 00 |....D... ........
+# <dbg> sdio: sdio wr
+#                      06 00 00 00 44 12 00 00  08 00 00 00 00 00 00 00 |....D... ........
+zephyr_header_ts_regex_pattern = '.*\[([0-9:.,]+)\] <(?:err|wrn|inf|dbg)> (.+)'
+zephyr_header_regex_pattern = '.*<(?:err|wrn|inf|dbg)> (.+)'
+zephyr_header_marker_regex_pattern = '> '
+# The ASCII part has no terminator, it ends at the end of the line
+zephyr_hex_dump_data_regex_pattern = \
+    '\s+([0-9a-f]{2}(?: {1,2}[0-9a-f]{2})*)\s+\|(.*)'
+
+# Maximum number of characters used by detect_format
+detect_sample_size = 64 << 10
+
+
+def _zephyr_ts(ts):
+    """ Converts a Zephyr log timestamp (hh:mm:ss.mmm,uuu) to seconds.
+    Timestamps without ':' (e.g. raw cycle counts) are returned as they are.
+    """
+
+    if ':' not in ts:
+        return ts
+    hours, minutes, seconds = ts.replace(',', '').split(':')
+    return (int(hours) * 60 + int(minutes)) * 60 + float(seconds)
+
+
+class HexFilterXxd(HexFilterLinux):
+
+    """ HexFilter class for filtering xxd hex dumps. xxd dumps have no
+    timestamps or descriptions.
+    """
+
+    dump_ts_regex_pattern = None
+    dump_regex_pattern = xxd_hex_dump_regex_pattern
+    dump_ftrace_regex_pattern = None
+    hex_part_width = 39
+    detect_patterns = (
+        ('[0-9a-f]{8}: [0-9a-f]{4}(?: |$)', {}),
+    )
+
+
+class _HexFilterRepeatedLines(HexFilterLinux):
+
+    """ Base class of the filters for formats where repeated dump lines are
+    replaced by a '*' line (hexdump and od).
+
+    A '*' line is expanded into copies of the dump line before it, with the
+    addresses of the repeated lines up to the address of the line after it
+    (the next dump line or the address line ending the dump). Since the
+    expanded lines depend on the lines before them, the log is always parsed
+    line by line (see HexFilter.filter_buffer).
+    """
+
+    # Regex pattern matching the address line ending a dump
+    end_address_regex_pattern = None
+    multiline_dumps = True
+
+    def __init__(self, *args, **kwargs):
+        """ Takes the same arguments as the HexFilterLinux constructor,
+        except ftrace_format.
+        """
+        HexFilterLinux.__init__(self, *args, **kwargs)
+
+        self.end_address_regex = re.compile(self.end_address_regex_pattern)
+        # The bytes regexes are only used by HexFilterLinux.filter_bytes
+        self.bytes_dump_regex = None
+        self.bytes_marker_regex = None
+
+        # The most recent dump line (None if the previous line was not a
+        # dump line), its address and number of values, and whether it was
+        # followed by a '*' line
+        self.prev_dump_line = None
+        self.prev_dump_addr = 0
+        self.prev_dump_len = 0
+        self.repeated = False
+
+    filter_buffer = HexFilter.filter_buffer
+    filter_bytes = HexFilter.filter_bytes
+
+    def parse_lines(self, lines, get_output=None):
+
+        return HexFilterLinux.parse_lines(self,
+                                          self.__expand_repeated_lines(lines),
+                                          get_output)
+
+    def __expand_repeated_lines(self, lines):
+
+        match_dump = self.dump_regex.match
+        match_end_address = self.end_address_regex.match
+
+        for line in lines:
+            dump_match = match_dump(line)
+            if self.repeated:
+                self.repeated = False
+                if dump_match is not None:
+                    addr = dump_match.group(2)
+                else:
+                    end_match = match_end_address(line)
+                    addr = None if end_match is None else end_match.group(1)
+                if addr is not None:
+                    for repeated_line in self.__repeated_lines(int(addr, 16)):
+                        yield repeated_line
+
+            if dump_match is not None:
+                _, addr, dump_data = dump_match.groups()
+                hex_part = dump_data.split(self.hex_ascii_separator, 1)[0]
+                self.prev_dump_line = line
+                self.prev_dump_addr = int(addr, 16)
+                self.prev_dump_len = len(hex_part.split())
+            elif line.rstrip() == '*' and self.prev_dump_line is not None:
+                self.repeated = True
+                continue
+            else:
+                self.prev_dump_line = None
+            yield line
+
+    def __repeated_lines(self, end_addr):
+
+        line = self.prev_dump_line
+        addr_len = len(line) - len(line.lstrip('0123456789abcdef'))
+        step = self.prev_dump_len
+        if step == 0:
+            return
+        for addr in range(self.prev_dump_addr + step, end_addr, step):
+            yield '%0*x' % (addr_len, addr) + line[addr_len:]
+
+
+class HexFilterHexdump(_HexFilterRepeatedLines):
+
+    """ HexFilter class for filtering hexdump -C (canonical format) dumps.
+    Repeated lines replaced by '*' are expanded.
+    """
+
+    dump_ts_regex_pattern = None
+    dump_regex_pattern = hexdump_hex_dump_regex_pattern
+    dump_ftrace_regex_pattern = None
+    dump_marker_regex_pattern = hexdump_hex_dump_marker_regex_pattern
+    end_address_regex_pattern = hexdump_end_address_regex_pattern
+    hex_ascii_separator = '  |'
+    ascii_part_end = '|'
+    hex_part_width = 48
+    detect_patterns = (
+        ('[0-9a-f]{8}  [0-9a-f]{2}(?: |$)', {}),
+    )
+
+
+class HexFilterOd(_HexFilterRepeatedLines):
+
+    """ HexFilter class for filtering od dumps with hex addresses and single
+    byte hex values (od -A x -t x1, optionally with the z suffix for the
+    ASCII part). Repeated lines replaced by '*' are expanded.
+    """
+
+    dump_ts_regex_pattern = None
+    dump_regex_pattern = od_hex_dump_regex_pattern
+    dump_ftrace_regex_pattern = None
+    dump_marker_regex_pattern = od_hex_dump_marker_regex_pattern
+    end_address_regex_pattern = od_end_address_regex_pattern
+    hex_ascii_separator = '  >'
+    ascii_part_end = '<'
+    hex_part_width = 47
+    detect_patterns = (
+        ('[0-9a-f]{6,} [0-9a-f]{2}(?: |$)', {}),
+    )
+
+
+class HexFilterUBoot(HexFilterLinux):
+
+    """ HexFilter class for filtering U-Boot md.b dumps (32 or 64 bit
+    addresses).
+    """
+
+    dump_ts_regex_pattern = None
+    dump_regex_pattern = uboot_hex_dump_regex_pattern
+    dump_ftrace_regex_pattern = None
+    detect_patterns = (
+        ('(?:[0-9a-f]{16}|[0-9a-f]{8}): [0-9a-f]{2}(?: |$)', {}),
+    )
+
+
+class HexFilterZephyr(HexFilterLinux):
+
+    """ HexFilter class for filtering Zephyr LOG_HEXDUMP dumps.
+
+    The timestamp and the description (module and message) of the dumps are
+    taken from the log message header line. The address of each dump line is
+    the offset from the start of the dump.
+
+    A dump line can't be parsed without its header line, so the log is always
+    parsed line by line (see HexFilter.filter_buffer).
+    """
+
+    dump_ts_regex_pattern = zephyr_header_ts_regex_pattern
+    dump_regex_pattern = zephyr_header_regex_pattern
+    dump_ftrace_regex_pattern = None
+    dump_marker_regex_pattern = zephyr_header_marker_regex_pattern
+    multiline_dumps = True
+    detect_patterns = (
+        (zephyr_header_ts_regex_pattern, {}),
+        (zephyr_header_regex_pattern, {'log_has_timestamps': False}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        """ HexFilterZephyr constructor
+
+        Takes the same arguments as the HexFilterLinux constructor, except
+        ftrace_format.
+        """
+        HexFilterLinux.__init__(self, *args, **kwargs)
+
+        self.data_regex = re.compile(zephyr_hex_dump_data_regex_pattern)
+        # The bytes regexes are only used by HexFilterLinux.filter_bytes
+        self.bytes_dump_regex = None
+        self.bytes_marker_regex = None
+
+        # Timestamp and description of the most recent header line (None
+        # before the first header line) and the offset of the next dump line
+        self.header_ts = None
+        self.header_desc = None
+        self.dump_offset = 0
+
+    filter_buffer = HexFilter.filter_buffer
+    filter_bytes = HexFilter.filter_bytes
+
+    def parse_line(self, line):
+        """ Parses a line of the log file and tries to interpret the hex data.
+
+        If no data could be retrieved (the line does not contain any valid
+        hex data), False will be returned.
+
+        If the line contains valid log data, the data will be read and stored
+        internally. In this case, True will be returned.
+        """
+
+        self.lines_seen += 1
+        if self.header_desc is not None:
+            data_match = self.data_regex.match(line)
+            if data_match is not None:
+                self.prefilter_passed += 1
+                self.regex_matched += 1
+                return self.__parse_data(*data_match.groups())
+
+        header_match = self.dump_regex.match(line)
+        if header_match is None:
+            # Any other line ends the dump
+            self.header_desc = None
+        else:
+            groups = header_match.groups()
+            if self.log_has_timestamps:
+                self.header_ts = _zephyr_ts(groups[0])
+            self.header_desc = groups[-1].rstrip('\r\n')
+            self.dump_offset = 0
+        self.handle_non_match(line)
+        return False
+
+    def __parse_data(self, dump_data, dump_data_ascii):
+
+        dump_data = ' '.join(dump_data.split())
+        num_values = (len(dump_data) + 1) // 3
+        # The ASCII part of a partial line is padded with spaces and has an
+        # extra space after the eighth character
+        dump_data_ascii = dump_data_ascii[:num_values + (num_values > 8)]
+        groups = [self.header_desc, '%08x' % self.dump_offset,
+                  dump_data + '  ' + dump_data_ascii]
+        if self.log_has_timestamps:
+            groups.insert(0, self.header_ts)
+        self.dump_offset += num_values
+        return self.parse_dump_groups(groups)
+
+
+# All supported dump formats (see detect_format). The order is the order of
+# precedence when detecting the format.
+hex_dump_formats = OrderedDict((
+    ('linux', HexFilterLinux),
+    ('xxd', HexFilterXxd),
+    ('hexdump', HexFilterHexdump),
+    ('od', HexFilterOd),
+    ('uboot', HexFilterUBoot),
+    ('zephyr', HexFilterZephyr),
+))
+
+
+def detect_format(sample):
+    """ Detects the dump format of a log from sample, the first part of the
+    log (e.g. detect_sample_size characters).
+
+    The lines of sample are matched against the detect_patterns of all
+    formats in hex_dump_formats. Returns (name, kwargs) of the pattern
+    matching the most lines, where kwargs are the constructor arguments
+    needed for the log (e.g. log_has_timestamps=False). If no line matches,
+    ('linux', {}) is returned.
+    """
+
+    candidates = [(name, re.compile(pattern).match, kwargs)
+                  for name, filter_class in hex_dump_formats.items()
+                  for pattern, kwargs in filter_class.detect_patterns]
+    counts = [0] * len(candidates)
+
+    for line in sample.splitlines():
+        for i, (_, match, _) in enumerate(candidates):
+            if match(line):
+                counts[i] += 1
+
+    best = max(range(len(candidates)), key=lambda i: (counts[i], -i))
+    if counts[best] == 0:
+        return 'linux', {}
+    name, _, kwargs = candidates[best]
+    return name, dict(kwargs)
+
+
+def detect_data_format(data):
+    """ Same as detect_format, but for a sample read in binary mode. At most
+    detect_sample_size bytes of data are used.
+    """
+
+    return detect_format(decode_line(data[:detect_sample_size]))
+
+
+def read_sample(fp):
+    """ Reads a sample of detect_sample_size bytes (or all data up to the end
+    of the file) from fp, a file object opened in binary mode that can't be
+    seeked, e.g. stdin. read1 is used if available, so that a pipe is read as
+    soon as data is available.
+    """
+
+    read = getattr(fp, 'read1', fp.read)
+    chunks = []
+    sample_len = 0
+    while sample_len < detect_sample_size:
+        data = read(detect_sample_size - sample_len)
+        if not data:
+            break
+        chunks.append(data)
+        sample_len += len(data)
+    return b''.join(chunks)
+
+
+def detect_file_format(path):
+    """ Detects the dump format of the log file path (which may be
+    compressed, see hexfilter.compress) from its first detect_sample_size
+    bytes, see detect_format.
+    """
+
+    with open_input(path) as fp:
+        return detect_data_format(fp.read(detect_sample_size))
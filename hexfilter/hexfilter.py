@@ -1,6 +1,6 @@
 
+import binascii
 import re
-import string
 # Check if we are running Python 2 or Python 3
 try:
     unicode = unicode
@@ -18,7 +18,13 @@ else:
     basestring = basestring
 
 from abc import ABCMeta, abstractmethod
-from collections import deque
+from collections import OrderedDict, deque, namedtuple
+try:
+    from functools import lru_cache
+except ImportError:
+    # Python 2, description filtering results will not be cached
+    def lru_cache(maxsize=128):
+        return lambda func: func
 
 ##
 # Linux definitions:
@@ -36,6 +42,13 @@ linux_hex_dump_ts_regex_pattern = '.*\[(\s*\d+\.\d+)\]\s+(.+)([0-9a-f]{8}):\s(.+
 # AR6K Async-768   [000] ....   277.806985: __dump_sdio_hex: sdio wr 00000000: 08 00 00 00
 linux_ftrace_hex_dump_ts_regex_pattern = '.*(\s+\d+\.\d+):\s+(.+)([0-9a-f]{8}):\s(.+)'
 
+# Pre-filter regex matching the address part (8 hex digits followed by ':'
+# and a whitespace) that all of the above regexes require. Since the pattern
+# starts with a literal, searching for it is a lot faster than trying the
+# full regex on every line. Only lines containing a match are checked
+# against the full regex.
+linux_hex_dump_marker_regex_pattern = ':\s(?<=[0-9a-f]{8}:\s)'
+
 # Linux hex_dump uses lower case (a-f) for all hex values
 linux_valid_hex_data_chars = '0123456789abcdef '
 
@@ -43,11 +56,217 @@ linux_valid_hex_data_chars = '0123456789abcdef '
 # Generic/default definitions (applicable to most hex dump formats):
 
 default_hex_dump_regex_pattern = '.+([0-9a-fA-F]{8}):\s(.+)'
-default_valid_hex_data_chars = string.hexdigits + ' '
-default_valid_ascii_chars = string.digits + string.ascii_letters + \
-                            string.punctuation + ' '
+# Same as string.hexdigits + ' ' and string.digits + string.ascii_letters +
+# string.punctuation + ' ' (the string module is not imported just for these)
+default_valid_hex_data_chars = '0123456789abcdefABCDEF '
+default_valid_ascii_chars = '0123456789' \
+                            'abcdefghijklmnopqrstuvwxyz' \
+                            'ABCDEFGHIJKLMNOPQRSTUVWXYZ' \
+                            '!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~ '
 default_max_num_hex_dump_values = 16
 
+# Maximum number of dump description strings for which the result of the
+# description filtering is cached
+dump_desc_cache_size = 1024
+
+# Reasons for rejecting a dump description (see HexFilterLinux.dump_desc_reject)
+desc_not_included = 1
+desc_excluded = 2
+
+# Number of characters read from a file in each call to read() by
+# HexFilter.filter_file
+default_block_size = 1 << 20
+
+
+def _split_lines(text):
+    """ Splits text into lines the same way as iterating over a file object,
+    i.e. only on newline characters, keeping the line endings.
+    """
+
+    lines = text.split('\n')
+    last = lines.pop()
+    lines = [line + '\n' for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+# Matches back references in a regex pattern. Patterns containing back
+# references can't be combined since the group numbers would change.
+_backref_regex = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def _desc_matcher(regexes):
+    """ Returns a function that checks if a description string matches any of
+    the regexes in the list regexes.
+
+    If possible, all regexes are combined into one alternation so the
+    description string can be checked with a single match call.
+    """
+
+    if len(regexes) == 1:
+        return regexes[0].match
+
+    default_flags = re.compile('').flags
+    if all(regex.flags == default_flags and
+           not _backref_regex.search(regex.pattern) for regex in regexes):
+        try:
+            return re.compile('|'.join('(?:{})'.format(regex.pattern)
+                                       for regex in regexes)).match
+        except re.error:
+            pass
+
+    def match_any(desc):
+        for regex in regexes:
+            if regex.match(desc):
+                return True
+        return False
+
+    return match_any
+
+
+def _invalid_chars_regex(valid_chars):
+    """ Returns a compiled regex matching any character not in valid_chars.
+    Searching with it validates a whole string in one (C level) call instead
+    of checking each character separately.
+    """
+
+    if not valid_chars:
+        return re.compile('.', re.DOTALL)
+    return re.compile('[^' + re.escape(valid_chars) + ']')
+
+
+def _count_lines(text, newline, start=0):
+    """ Returns the number of lines in text (a string or bytes like object)
+    from the offset start.
+    """
+
+    if len(text) <= start:
+        return 0
+
+    count = getattr(text, 'count', None)
+    if count is not None:
+        num_lines = count(newline, start)
+    else:
+        # E.g. mmap, which has no count method
+        num_lines = 0
+        for pos in range(start, len(text), default_block_size):
+            num_lines += text[pos:pos + default_block_size].count(newline)
+
+    if text[-1:] != newline:
+        num_lines += 1
+    return num_lines
+
+
+def _hex_output_format(show_ts, show_desc, show_ascii, hex_part_width):
+    """ Returns a %-format string for an output line of get_hex. The format
+    takes five values: timestamp, description, address, hex data and ASCII
+    part. Values that are not shown are consumed by a '%.0s' conversion, so
+    all formats take the same arguments.
+
+    The ASCII part is aligned as if the hex data was hex_part_width
+    characters long, followed by two spaces.
+    """
+
+    fmt = '[%.6f] ' if show_ts else '%.0s'
+    fmt += '%s ' if show_desc else '%.0s'
+    if show_ascii:
+        return fmt + '%%s: %%-%ds%%s' % (hex_part_width + 2)
+    return fmt + '%s: %s%.0s'
+
+
+def decode_line(line):
+    """ Decodes a line (or part of a line) read in binary mode into a string.
+    \r\n and \r line endings are converted into \n in the same way as when
+    reading a file opened in text mode (universal newlines).
+    """
+
+    return line.decode('utf-8', 'replace').replace('\r\n', '\n') \
+        .replace('\r', '\n')
+
+
+def find_line_start(data, pos):
+    """ Returns the start of the line in data (a bytes like object) containing
+    pos, or ending at pos. Lines end with \n, \r\n or \r, as in text mode.
+    """
+
+    start = data.rfind(b'\n', 0, pos) + 1
+    return data.rfind(b'\r', start, pos) + 1 or start
+
+
+def find_line_end(data, pos):
+    """ Returns the position of the line ending (\n, \r\n or \r) of the
+    line in data (a bytes like object) containing pos, or len(data) if the
+    line has no line ending.
+    """
+
+    end = data.find(b'\n', pos)
+    if end < 0:
+        end = len(data)
+    cr = data.find(b'\r', pos, end)
+    return end if cr < 0 else cr
+
+
+def _universal_newline_blocks(data, block_size=default_block_size, start=0):
+    """ Yields data (a bytes like object) from the offset start in blocks of
+    complete lines, with \r\n and \r line endings converted into \n in the
+    same way as when reading a file opened in text mode. Only one block at a
+    time is copied, so data can be a memory mapped file.
+    """
+
+    data_len = len(data)
+    pos = start
+    while pos < data_len:
+        end = pos + block_size
+        if end >= data_len:
+            end = data_len
+        else:
+            # A \r before the last byte can't be the start of a \r\n split
+            # between two blocks
+            line_end = max(data.rfind(b'\n', pos, end),
+                           data.rfind(b'\r', pos, end - 1))
+            if line_end < 0:
+                # A line longer than the block
+                block_size *= 2
+                continue
+            end = line_end + 1
+        yield bytes(data[pos:end]).replace(b'\r\n', b'\n') \
+            .replace(b'\r', b'\n')
+        pos = end
+
+
+class HexDumpRecord(namedtuple('HexDumpRecord',
+                               ['ts', 'ts_diff', 'desc', 'addr', 'data',
+                                'ascii'])):
+
+    """ Immutable record of a parsed hex dump line (see
+    HexFilter.get_record).
+
+    ts      -- Absolute log timestamp (or None if the log has no timestamps or
+               they are skipped)
+    ts_diff -- Delta time to the previous dump (or None, same as ts)
+    desc    -- Description string of the dump
+    addr    -- (int) Address/offset of the line
+    data    -- Hex part of the line, e.g. '06 00 00 00'
+    ascii   -- ASCII part of the line (or None if the line has no ASCII part)
+
+    Records have no instance dictionary, so millions of them can be kept in
+    memory. Equal description strings are shared between the records of a
+    filter.
+    """
+
+    __slots__ = ()
+
+    def get_bytes(self):
+        """ Returns the data of the record as bytes or None if the hex data
+        can't be converted (see HexFilterLinux.get_hex_bytes).
+        """
+
+        try:
+            return binascii.unhexlify(self.data.replace(' ', ''))
+        except (TypeError, ValueError):
+            return None
+
 
 ##
 # HexFilter abstract base class
@@ -62,7 +281,10 @@ class HexFilter:
                  skip_timestamps=False,
                  abs_timestamps=False,
                  timestamps_round_us=0,
-                 keep_n_lines_before_each_dump=0):
+                 keep_n_lines_before_each_dump=0,
+                 start_ts=None,
+                 end_ts=None,
+                 keep_n_lines_after_each_dump=0):
         """ HexFilter constructor
 
         This is the HexFilter base class constructor used by inheriting
@@ -90,9 +312,22 @@ class HexFilter:
                                    this limit, older lines will be rotated out
                                    before new lines are inserted
                                    (default 0)
+        start_ts                -- (float) Skip all dumps with a log timestamp
+                                   before start_ts (default None)
+        end_ts                  -- (float) Stop filtering at the first dump
+                                   with a log timestamp after end_ts
+                                   (default None)
+        keep_n_lines_after_each_dump -- (int) Number of non hex lines after
+                                   each dump to store internally by parse_line
+                                   (see get_lines_after_hex). These lines are
+                                   not stored as before-dump-lines
+                                   (default 0)
         """
         self.valid_hex_data_chars = valid_hex_data_chars
         self.valid_ascii_chars = valid_ascii_chars
+        self.invalid_hex_data_char = \
+            _invalid_chars_regex(valid_hex_data_chars).search
+        self.invalid_ascii_char = _invalid_chars_regex(valid_ascii_chars).search
         self.max_num_hex_dump_values = max_num_hex_dump_values
 
         if hex_dump_regex_pattern:
@@ -105,14 +340,41 @@ class HexFilter:
         self.abs_timestamps = abs_timestamps
         self.timestamps_round_us = timestamps_round_us
         self.prev_ts = None
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.ts_window = start_ts is not None or end_ts is not None
+        self.end_ts_passed = False
         self.data_available = False
 
         self.keep_n_lines_before_each_dump = keep_n_lines_before_each_dump
         if self.keep_n_lines_before_each_dump > 0:
-            self.before_lines = deque()
+            self.before_lines = deque(maxlen=keep_n_lines_before_each_dump)
         else:
             self.before_lines = None
 
+        self.keep_n_lines_after_each_dump = keep_n_lines_after_each_dump
+        if self.keep_n_lines_after_each_dump > 0:
+            self.after_lines = deque(maxlen=keep_n_lines_after_each_dump)
+        else:
+            self.after_lines = None
+        # Number of non hex lines left to store after the most recent dump
+        self.after_lines_left = 0
+        # Cumulative time in seconds spent in each stage of the parsing, or
+        # None if the stages are not timed (see enable_stage_times)
+        self.stage_times = None
+
+    def enable_stage_times(self):
+        """ Starts measuring the time spent in each stage of the parsing (see
+        hexfilter.stats). The times are available in stage_times and in the
+        result of get_stats.
+
+        Timing adds some overhead to every parsed line, so it is disabled
+        by default.
+        """
+
+        from .stats import time_stages
+        self.stage_times = time_stages(self)
+
     def update_ts(self, ts):
         """ Protected/private method used by inheriting classes.
 
@@ -142,6 +404,135 @@ class HexFilter:
 
         return True
 
+    def ts_in_window(self, ts):
+        """ Protected/private method used by inheriting classes.
+
+        Returns True if the log timestamp ts is within the time window set by
+        start_ts and end_ts. Dumps outside the window are skipped without
+        updating the timestamp state, so delta times are relative to the
+        first dump within the window.
+
+        end_ts_passed is set when a timestamp after end_ts is encountered.
+        The log timestamps are assumed to be increasing, so filtering stops
+        at that point.
+        """
+
+        ts = float(ts)
+        if self.end_ts is not None and ts > self.end_ts:
+            self.end_ts_passed = True
+            return False
+        return self.start_ts is None or ts >= self.start_ts
+
+    def get_output(self):
+        """ Returns the output text for the most recently parsed hex dump,
+        i.e. the stored non hex lines before the dump (if any) followed by
+        the formatted hex dump line and a line ending.
+
+        This is the default output of parse_lines, filter_buffer etc.
+        With the default output, these methods also yield the non hex lines
+        after each dump (see keep_n_lines_after_each_dump) as soon as they
+        have been parsed.
+        """
+
+        hex_line = self.get_hex() + '\n'
+        if self.keep_n_lines_before_each_dump > 0:
+            before = self.get_lines_before_hex()
+            if before:
+                return before + hex_line
+        return hex_line
+
+    def parse_records(self, lines):
+        """ Parses all lines of an iterable and yields a HexDumpRecord for
+        every hex dump (see get_record).
+
+        The other filter methods (filter_buffer, filter_file etc.) can return
+        records as well by using get_record as get_output.
+        """
+
+        return self.parse_lines(lines, self.get_record)
+
+    def parse_lines(self, lines, get_output=None):
+        """ Parses all lines of an iterable (e.g. a file object) and yields the
+        filtered output.
+
+        get_output is called after each parsed hex dump and its return value
+        is yielded (unless it is None). If no get_output is given, get_output
+        of the filter will be used, i.e. each yielded string is a chunk of
+        output text including line endings. Concatenating all yielded strings
+        gives the same output as calling parse_line, get_lines_before_hex and
+        get_hex for every line.
+        """
+
+        parse_line = self.parse_line
+        after = get_output is None and self.keep_n_lines_after_each_dump > 0
+        if get_output is None:
+            get_output = self.get_output
+        check_end = self.end_ts is not None
+
+        for line in lines:
+            if parse_line(line):
+                output = get_output()
+                if output is not None:
+                    yield output
+            elif after and self.after_lines:
+                yield self.get_lines_after_hex()
+            elif check_end and self.end_ts_passed:
+                break
+
+    def filter_buffer(self, text, get_output=None):
+        """ Parses a block of text containing several lines and yields the
+        filtered output in the same way as parse_lines.
+
+        The block should consist of complete lines. A trailing line without
+        a line ending is treated as a complete line.
+        """
+
+        return self.parse_lines(_split_lines(text), get_output)
+
+    def filter_bytes(self, data, get_output=None, start=0):
+        """ Same as filter_buffer, but for bytes like objects (bytes, bytearray,
+        mmap etc.) read from a file opened in binary mode. Filtering starts at
+        the offset start, which must be the start of a line.
+
+        If no get_output is given, the yielded output chunks are UTF-8
+        encoded bytes.
+        """
+
+        outputs = self.filter_buffer(decode_line(bytes(data[start:])),
+                                     get_output)
+        if get_output is not None:
+            return outputs
+        return (output.encode('utf-8') for output in outputs)
+
+    def filter_file(self, fp, block_size=default_block_size, get_output=None):
+        """ Reads fp in blocks of block_size characters and yields the
+        filtered output in the same way as parse_lines.
+
+        Each block is cut at the last line ending before it is passed to
+        filter_buffer, so no line is split between two blocks.
+        """
+
+        remainder = ''
+        while True:
+            block = fp.read(block_size)
+            if not block:
+                break
+            if remainder:
+                block = remainder + block
+            line_end = block.rfind('\n')
+            if line_end < 0:
+                remainder = block
+                continue
+            remainder = block[line_end + 1:]
+            for output in self.filter_buffer(block[:line_end + 1], get_output):
+                yield output
+            if self.end_ts_passed:
+                return
+
+        if remainder:
+            for output in self.filter_buffer(remainder, get_output):
+                yield output
+
     @abstractmethod
     def parse_line(self, line):
         """ Parses a line of the log file and tries to interpret the hex data.
@@ -166,6 +557,13 @@ class HexFilter:
         """
         pass
 
+    @abstractmethod
+    def get_record(self):
+        """ Returns the most recently parsed hex dump as a HexDumpRecord or
+        None if no hex dump is available, in the same way as get_hex.
+        """
+        pass
+
     @abstractmethod
     def get_lines_before_hex(self):
         """ Returns the most recent non hex data string that was encountered
@@ -181,6 +579,17 @@ class HexFilter:
         """
         pass
 
+    @abstractmethod
+    def get_lines_after_hex(self):
+        """ Returns the non hex lines encountered after the most recent hex
+        dump, or None if there are no such lines. At most
+        keep_n_lines_after_each_dump lines are stored after each dump.
+
+        The internal storage is cleared in the same way as by
+        get_lines_before_hex.
+        """
+        pass
+
 
 ##
 # HexFilterLinux
@@ -188,14 +597,57 @@ class HexFilterLinux(HexFilter):
 
     """ HexFilter class for filtering linux print_hex_data dumps
     from a linux kernel log.
+
+    The class attributes below describe the dump format. Filters for other
+    formats with one dump line per log line (see hexfilter.formats) inherit
+    this class and override them.
     """
+
+    # Dump regex patterns for logs with printk timestamps, without timestamps
+    # and for ftrace logs (see the constructor). The groups of the patterns
+    # are: timestamp (not in dump_regex_pattern), description, address and
+    # dump data. Formats without timestamps set the first and last pattern
+    # to None.
+    dump_ts_regex_pattern = linux_hex_dump_ts_regex_pattern
+    dump_regex_pattern = linux_hex_dump_regex_pattern
+    dump_ftrace_regex_pattern = linux_ftrace_hex_dump_ts_regex_pattern
+    # Pre-filter regex pattern (see linux_hex_dump_marker_regex_pattern)
+    dump_marker_regex_pattern = linux_hex_dump_marker_regex_pattern
+    # Separator between the hex part and the ASCII part of the dump data.
+    # A linux kernel hex_dump will always have at least two spaces between
+    # the hex part and the ASCII part.
+    hex_ascii_separator = '  '
+    # Character ending an enclosed ASCII part (e.g. '|' for hexdump -C), or
+    # None. The hex part of such formats is padded with spaces.
+    ascii_part_end = None
+    # Length of the hex part of a full dump line, used for aligning the ASCII
+    # part of the output. None means three characters per value
+    # (max_num_hex_dump_values).
+    hex_part_width = None
+    # True if a dump line can't be parsed without the lines before it, i.e.
+    # the log can't be split into chunks (--jobs) or indexed.
+    multiline_dumps = False
+    # (regex pattern, constructor arguments) tuples used for detecting the
+    # format of a log (see hexfilter.formats.detect_format). The patterns are
+    # stricter than the dump regex patterns, so that they don't match the
+    # dump lines of other formats.
+    detect_patterns = (
+        ('.*\[\s*\d+\.\d+\]\s+.*[0-9a-f]{8}: [0-9a-f]{2}', {}),
+        ('.*\s\d+\.\d+:\s+.+[0-9a-f]{8}: [0-9a-f]{2}',
+         {'ftrace_format': True}),
+        ('.*\S\s+[0-9a-f]{8}: [0-9a-f]{2}', {'log_has_timestamps': False}),
+    )
+
     def __init__(self, skip_timestamps=False, abs_timestamps=False,
                  timestamps_round_us=0, log_has_timestamps=True,
                  dump_desc=None, dump_desc_invert=None,
                  include_dump_desc_in_output=False,
                  keep_n_lines_before_each_dump=0,
                  remove_ascii_part=False,
-                 ftrace_format=False):
+                 ftrace_format=False,
+                 start_ts=None,
+                 end_ts=None,
+                 keep_n_lines_after_each_dump=0):
         """ HexFilterLinux constructor
 
         Constructor for linux kernel log parser .
@@ -229,13 +681,53 @@ class HexFilterLinux(HexFilter):
                                    (default False)
         remove_ascii_part       -- (bool) Remove the ASCII part of the hexdump from
                                    the output.
+        start_ts                -- (float) Skip all dumps with a log timestamp
+                                   before start_ts. Requires log timestamps
+                                   (default None)
+        end_ts                  -- (float) Stop filtering at the first dump
+                                   with a log timestamp after end_ts.
+                                   Requires log timestamps (default None)
+        keep_n_lines_after_each_dump -- (int) Number of non hex lines to keep
+                                   after each dump (default 0)
         """
+        if ftrace_format and self.dump_ftrace_regex_pattern is None:
+            raise ValueError("{} does not support ftrace logs".format(
+                type(self).__name__))
+        if self.dump_ts_regex_pattern is None:
+            # The format has no timestamps
+            log_has_timestamps = False
+
         if ftrace_format:
-            regex_pattern = linux_ftrace_hex_dump_ts_regex_pattern
+            regex_pattern = self.dump_ftrace_regex_pattern
         elif log_has_timestamps:
-            regex_pattern = linux_hex_dump_ts_regex_pattern
+            regex_pattern = self.dump_ts_regex_pattern
         else:
-            regex_pattern = linux_hex_dump_regex_pattern
+            regex_pattern = self.dump_regex_pattern
+
+        self.marker_regex = re.compile(self.dump_marker_regex_pattern)
+        # bytes versions of the regexes (see filter_bytes)
+        self.bytes_dump_regex = re.compile(regex_pattern.encode('ascii'))
+        self.bytes_marker_regex = \
+            re.compile(self.dump_marker_regex_pattern.encode('ascii'))
+
+        # Pre-filter counters:
+        # lines_seen       -- Number of parsed lines
+        # prefilter_passed -- Number of lines passing the pre-filter
+        #                     (marker_regex)
+        # regex_matched    -- Number of lines matching the full dump regex
+        self.lines_seen = 0
+        self.prefilter_passed = 0
+        self.regex_matched = 0
+        # Reject counters, the number of matching dump lines rejected because
+        # of the time window (start_ts/end_ts), the description (not matching
+        # dump_desc or matching dump_desc_invert) or invalid characters in
+        # the hex or ASCII part, and the number of dumps passing all filters.
+        self.ts_rejected = 0
+        self.desc_include_rejected = 0
+        self.desc_exclude_rejected = 0
+        self.hex_invalid = 0
+        self.ascii_invalid = 0
+        self.dumps_passed = 0
 
         HexFilter.__init__(self,
                            hex_dump_regex_pattern=regex_pattern,
@@ -243,12 +735,31 @@ class HexFilterLinux(HexFilter):
                            skip_timestamps=skip_timestamps,
                            abs_timestamps=abs_timestamps,
                            timestamps_round_us=timestamps_round_us,
-                           keep_n_lines_before_each_dump=keep_n_lines_before_each_dump)
+                           keep_n_lines_before_each_dump=keep_n_lines_before_each_dump,
+                           start_ts=start_ts,
+                           end_ts=end_ts,
+                           keep_n_lines_after_each_dump=keep_n_lines_after_each_dump)
 
         self.log_has_timestamps = log_has_timestamps
+        # Description strings shared by all records (see get_record)
+        self.record_descs = {}
         self.include_dump_desc_in_output = include_dump_desc_in_output
         self.remove_ascii_part = remove_ascii_part
 
+        # Output line formats (see get_hex), indexed by [desc shown][ASCII
+        # part shown]. They only depend on the constructor arguments, so the
+        # layout is only computed once.
+        self.show_ts = log_has_timestamps and not skip_timestamps
+        hex_part_width = self.hex_part_width
+        if hex_part_width is None:
+            hex_part_width = self.max_num_hex_dump_values * 3 - 1
+        self.hex_formats = tuple(
+            tuple(_hex_output_format(self.show_ts, show_desc,
+                                     show_ascii and not remove_ascii_part,
+                                     hex_part_width)
+                  for show_ascii in (False, True))
+            for show_desc in (False, include_dump_desc_in_output))
+
         if dump_desc:
             self.dump_desc_regexes = []
             if isinstance(dump_desc, basestring):
@@ -269,34 +780,91 @@ class HexFilterLinux(HexFilter):
         else:
             self.dump_desc_invert_regexes = None
 
-    def __store_non_hex_line(self, line, lines, limit):
+        if self.dump_desc_regexes or self.dump_desc_invert_regexes:
+            # Description strings are typically repeated a lot, so the
+            # result of the filtering is cached for each string.
+            self.dump_desc_reject = \
+                lru_cache(maxsize=dump_desc_cache_size)(self.__dump_desc_reject)
+            self.dump_desc_filter = self.__check_dump_desc
+        else:
+            self.dump_desc_reject = None
+            self.dump_desc_filter = None
+        if self.dump_desc_regexes:
+            self.__match_dump_desc = _desc_matcher(self.dump_desc_regexes)
+        if self.dump_desc_invert_regexes:
+            self.__match_dump_desc_invert = \
+                _desc_matcher(self.dump_desc_invert_regexes)
 
-        if limit == len(lines):
-            # Shift out the oldest stored line and make place
-            # for a new line
-            lines.rotate(1)
-            lines.popleft()
+    def handle_non_match(self, line):
+        """ Protected/private method used by inheriting classes.
 
-        # Append the new line before the old ones
-        lines.appendleft(line)
+        Stores a non hex line as a line after the previous dump or before the
+        next dump (see keep_n_lines_after_each_dump and
+        keep_n_lines_before_each_dump).
+        """
 
-    def __handle_non_match(self, line):
+        # The line rings (deque with maxlen) drop the oldest line when full
+        if self.after_lines_left > 0:
+            self.after_lines.append(line)
+            self.after_lines_left -= 1
+        elif self.keep_n_lines_before_each_dump > 0:
+            self.before_lines.append(line)
+
+    def __handle_non_match_block(self, text, start, end, newline, decode):
+
+        if start >= end:
+            return
+
+        if self.after_lines_left > 0:
+            # The first lines of the block are stored after the previous dump
+            line_end = start
+            for _ in range(self.after_lines_left):
+                line_end = text.find(newline, line_end, end) + 1
+                if line_end <= 0:
+                    line_end = end
+                if line_end >= end:
+                    break
+
+            lines = text[start:line_end]
+            if decode:
+                lines = decode(lines)
+            for line in _split_lines(lines):
+                self.handle_non_match(line)
+            start = line_end
+
+        if self.keep_n_lines_before_each_dump <= 0 or start >= end:
+            return
+
+        # Only the last keep_n_lines_before_each_dump lines of the block
+        # can end up in the output, so there is no need to split the rest.
+        line_start = end - 1
+        for _ in range(self.keep_n_lines_before_each_dump):
+            line_start = text.rfind(newline, start, line_start)
+            if line_start < 0:
+                line_start = start - 1
+                break
 
-        if self.keep_n_lines_before_each_dump > 0:
-            self.__store_non_hex_line(line, self.before_lines,
-                                      self.keep_n_lines_before_each_dump)
+        lines = text[line_start + 1:end]
+        if decode:
+            lines = decode(lines)
+        for line in _split_lines(lines):
+            self.handle_non_match(line)
 
-    def __match_dump_desc(self, regexes):
+    def __dump_desc_reject(self, desc):
 
-        matching_str_found = False
+        if self.dump_desc_regexes:
+            if not self.__match_dump_desc(desc):
+                return desc_not_included
 
-        for regex in regexes:
-            desc_match = regex.match(self.cur_dump_desc)
-            if desc_match:
-                matching_str_found = True
-                break
+        if self.dump_desc_invert_regexes:
+            if self.__match_dump_desc_invert(desc):
+                return desc_excluded
+
+        return 0
 
-        return matching_str_found
+    def __check_dump_desc(self, desc):
+
+        return not self.dump_desc_reject(desc)
 
     def parse_line(self, line):
         """ Parses a line of the log file and tries to interpret the hex data.
@@ -308,54 +876,193 @@ class HexFilterLinux(HexFilter):
         internally. In this case, True will be returned.
         """
 
+        self.lines_seen += 1
+        if self.marker_regex.search(line) is None:
+            self.handle_non_match(line)
+            return False
+        self.prefilter_passed += 1
+
         dump_match = self.dump_regex.match(line)
         if dump_match is None:
-            self.__handle_non_match(line)
+            self.handle_non_match(line)
             return False
+        self.regex_matched += 1
+
+        return self.parse_dump_groups(dump_match.groups())
+
+    def parse_dump_groups(self, groups):
+        """ Protected/private method used by inheriting classes.
 
-        match_idx = 1
+        Parses the groups of a dump regex match (see dump_regex_pattern) and
+        stores the dump. Returns True if the dump is valid and passes the
+        filters.
+        """
+
+        match_idx = 0
         if self.log_has_timestamps:
-            log_ts = dump_match.group(match_idx)
+            log_ts = groups[match_idx]
             match_idx += 1
+            if self.ts_window and not self.ts_in_window(log_ts):
+                self.ts_rejected += 1
+                return False
             if not self.skip_timestamps and not self.update_ts(log_ts):
                 return False
 
-        self.cur_dump_desc = dump_match.group(match_idx)
+        self.cur_dump_desc = groups[match_idx]
         match_idx += 1
 
-        if self.dump_desc_regexes:
-            if not self.__match_dump_desc(self.dump_desc_regexes):
+        if self.dump_desc_reject is not None:
+            reject = self.dump_desc_reject(self.cur_dump_desc)
+            if reject:
+                if reject == desc_not_included:
+                    self.desc_include_rejected += 1
+                else:
+                    self.desc_exclude_rejected += 1
                 return False
 
-        if self.dump_desc_invert_regexes:
-            if self.__match_dump_desc(self.dump_desc_invert_regexes):
-                return False
-
-        self.dump_addr = dump_match.group(match_idx)
+        self.dump_addr = groups[match_idx]
         match_idx += 1
-        dump_data = dump_match.group(match_idx)
+        dump_data = groups[match_idx]
         # Split up dump data into hex part and ASCII part
-        # A linux kernel hex_dump will always have at least two
-        # spaces between the hex part and the ASCII part.
-        dump_data_a = dump_data.split('  ', 1)
-        if len(dump_data_a) > 2:
-            return False
+        dump_data_a = dump_data.split(self.hex_ascii_separator, 1)
 
         self.dump_data = dump_data_a[0]
-        if not all(c in self.valid_hex_data_chars for c in self.dump_data):
+        if self.ascii_part_end is not None:
+            self.dump_data = self.dump_data.rstrip(' ')
+        if self.invalid_hex_data_char(self.dump_data):
+            self.hex_invalid += 1
             return False
 
         if len(dump_data_a) == 2:
             self.dump_data_ascii = dump_data_a[1]
             self.dump_data_ascii = self.dump_data_ascii.lstrip(' ')
-            if not all(c in self.valid_ascii_chars for c in self.dump_data_ascii):
+            if self.ascii_part_end is not None and \
+               self.dump_data_ascii.endswith(self.ascii_part_end):
+                self.dump_data_ascii = self.dump_data_ascii[:-1]
+            if self.invalid_ascii_char(self.dump_data_ascii):
+                self.ascii_invalid += 1
                 return False
         else:
             self.dump_data_ascii = None
 
+        self.dumps_passed += 1
         self.data_available = True
+        self.after_lines_left = self.keep_n_lines_after_each_dump
         return True
 
+    def __filter_block(self, text, dump_regex, marker_regex, newline, decode,
+                       get_output, start=0):
+
+        search_marker = marker_regex.search
+        match = dump_regex.match
+        parse_dump_groups = self.parse_dump_groups
+        handle_non_match_block = self.__handle_non_match_block
+        after = get_output is None and self.keep_n_lines_after_each_dump > 0
+        if get_output is None:
+            get_output = self.get_output
+        text_len = len(text)
+        self.lines_seen += _count_lines(text, newline, start)
+        # Start of the text not yet handled
+        pos = start
+        # Start of the text not yet searched for markers
+        search_pos = start
+
+        while True:
+            marker = search_marker(text, search_pos)
+            if marker is None:
+                handle_non_match_block(text, pos, text_len, newline, decode)
+                if after and self.after_lines:
+                    yield self.get_lines_after_hex()
+                break
+
+            marker_pos = marker.start()
+            line_start = text.rfind(newline, 0, marker_pos) + 1
+            line_end = text.find(newline, marker_pos)
+            if line_end < 0:
+                line_end = text_len
+            search_pos = line_end + 1
+            self.prefilter_passed += 1
+
+            dump_match = match(text, line_start, line_end + 1)
+            if dump_match is None:
+                continue
+
+            groups = dump_match.groups()
+            if decode:
+                groups = [decode(group) for group in groups]
+            self.regex_matched += 1
+
+            handle_non_match_block(text, pos, line_start, newline, decode)
+            if after and self.after_lines:
+                yield self.get_lines_after_hex()
+            pos = line_end + 1
+
+            if parse_dump_groups(groups):
+                output = get_output()
+                if output is not None:
+                    yield output
+            elif self.end_ts_passed:
+                return
+
+    def filter_buffer(self, text, get_output=None):
+        """ Parses a block of text containing several lines and yields the
+        filtered output in the same way as parse_lines.
+
+        Instead of matching each line separately, the whole block is searched
+        for the address part of the hex dumps in one go (see
+        linux_hex_dump_marker_regex_pattern). Only the lines containing an
+        address (and the non hex lines that must be kept before each dump) are
+        handled line by line.
+
+        The block should consist of complete lines. A trailing line without
+        a line ending is treated as a complete line.
+        """
+
+        return self.__filter_block(text, self.dump_regex, self.marker_regex,
+                                   '\n', None, get_output)
+
+    def __filter_blocks(self, blocks, get_output):
+
+        for block in blocks:
+            for output in self.__filter_block(block, self.bytes_dump_regex,
+                                              self.bytes_marker_regex,
+                                              b'\n', decode_line,
+                                              get_output):
+                yield output
+            if self.end_ts_passed:
+                return
+
+    def filter_bytes(self, data, get_output=None, start=0):
+        """ Same as filter_buffer, but for bytes like objects (bytes, bytearray,
+        mmap etc.) read from a file opened in binary mode. Filtering starts at
+        the offset start, which must be the start of a line.
+
+        The block is searched with bytes regexes, so only the hex dump lines
+        (and the non hex lines kept before each dump) are decoded.
+        This makes it possible to filter a memory mapped file (or a part of
+        it) without reading it into memory.
+
+        Line endings are handled in the same way as when reading a file
+        opened in text mode (universal newlines). If data contains \r
+        characters, it is filtered in blocks with all line endings converted
+        into \n.
+
+        If no get_output is given, the yielded output chunks are UTF-8
+        encoded bytes.
+        """
+
+        if data.find(b'\r', start) < 0:
+            outputs = self.__filter_block(data, self.bytes_dump_regex,
+                                          self.bytes_marker_regex,
+                                          b'\n', decode_line, get_output,
+                                          start)
+        else:
+            blocks = _universal_newline_blocks(data, start=start)
+            outputs = self.__filter_blocks(blocks, get_output)
+        if get_output is not None:
+            return outputs
+        return (output.encode('utf-8') for output in outputs)
+
     def get_hex(self):
         """ Returns the most recent hex data string or None if no hex data
         string is available. Not available could mean that no valid hex string
@@ -368,41 +1075,87 @@ class HexFilterLinux(HexFilter):
 
         if not self.data_available:
             return None
+        self.data_available = False
 
-        ljust_len = 0
-        str = ''
-        if self.log_has_timestamps and not self.skip_timestamps:
-            if self.abs_timestamps:
-                str = '[{:.6f}] '.format(self.ts)
-            else:
-                str = '[{:.6f}] '.format(self.ts_diff)
-            ljust_len = len(str)
+        if not self.show_ts:
+            ts = None
+        elif self.abs_timestamps:
+            ts = self.ts
+        else:
+            ts = self.ts_diff
+
+        ascii = self.dump_data_ascii
+        fmt = self.hex_formats[bool(self.cur_dump_desc)][ascii is not None]
+        str = fmt % (ts, self.cur_dump_desc, self.dump_addr, self.dump_data,
+                     ascii)
+        if ascii is None or self.remove_ascii_part:
+            return str.rstrip(' ')
+        return str
 
-        if self.include_dump_desc_in_output and self.cur_dump_desc:
-            str = '{}{} '.format(str, self.cur_dump_desc)
-            ljust_len = len(str)
+    def get_record(self):
+        """ Returns the most recently parsed hex dump as a HexDumpRecord or
+        None if no hex dump is available, in the same way as get_hex.
 
-        str = '{}{}: {}'.format(str, self.dump_addr, self.dump_data)
+        Can be used as the get_output argument of the filter methods
+        (parse_lines, filter_buffer etc.) in order to get records instead of
+        output text.
+        """
 
-        if not self.remove_ascii_part and self.dump_data_ascii is not None:
-            ljust_len += len(self.dump_addr) + 1 + self.max_num_hex_dump_values * 3 + 2
-            str = str.ljust(ljust_len)
-            str = '{}{}'.format(str, self.dump_data_ascii)
+        if not self.data_available:
+            return None
+
+        if self.log_has_timestamps and not self.skip_timestamps:
+            ts = self.ts
+            ts_diff = self.ts_diff
         else:
-            str = str.rstrip(' ')
+            ts = None
+            ts_diff = None
+
+        desc = self.record_descs.setdefault(self.cur_dump_desc,
+                                            self.cur_dump_desc)
 
         self.data_available = False
-        return str
+        return HexDumpRecord(ts, ts_diff, desc, int(self.dump_addr, 16),
+                             self.dump_data, self.dump_data_ascii)
+
+    def get_stats(self):
+        """ Returns the counters of the filter (lines seen, lines passing
+        each stage, rejected dumps per reason and dumps passing all filters)
+        as an OrderedDict. If the stages are timed (see enable_stage_times),
+        the cumulative time of each stage is included as 'stage_times'.
+        """
 
-    def __get_non_hex_lines(self, lines):
+        stats = OrderedDict((name, getattr(self, name))
+                            for name in ('lines_seen', 'prefilter_passed',
+                                         'regex_matched', 'ts_rejected',
+                                         'desc_include_rejected',
+                                         'desc_exclude_rejected',
+                                         'hex_invalid', 'ascii_invalid',
+                                         'dumps_passed'))
+        if self.stage_times is not None:
+            stats['stage_times'] = OrderedDict(self.stage_times)
+        return stats
+
+    def get_hex_bytes(self):
+        """ Returns the data of the most recently parsed hex dump as bytes
+        or None if the hex data can't be converted (e.g. if it contains an
+        odd number of hex digits).
+
+        Multi byte groups (print_hex_dump with groupsize > 1) are converted
+        in the order they appear in the dump.
+        """
 
-        if lines is None or len(lines) == 0:
+        try:
+            return binascii.unhexlify(self.dump_data.replace(' ', ''))
+        except (TypeError, ValueError):
             return None
 
-        str = ''
-        for line in reversed(lines):
-            str = '{}{}'.format(str, line)
+    def __get_non_hex_lines(self, lines):
+
+        if not lines:
+            return None
 
+        str = ''.join(lines)
         lines.clear()
 
         return str
@@ -410,3 +1163,7 @@ class HexFilterLinux(HexFilter):
     def get_lines_before_hex(self):
 
         return self.__get_non_hex_lines(self.before_lines)
+
+    def get_lines_after_hex(self):
+
+        return self.__get_non_hex_lines(self.after_lines)
@@ -0,0 +1,312 @@
+import array
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+
+from .hexfilter import decode_line, find_line_end, find_line_start
+
+# Extension of the sidecar index files (see index_path)
+index_extension = '.hfidx'
+
+# Index file header:
+# magic, source file size, source file mtime, number of dump lines,
+# number of descriptions, length of the dump regex pattern
+index_header = struct.Struct('<8sQdQII')
+index_magic = b'HFIDX\x00\x02\x00'
+
+_desc_length = struct.Struct('<H')
+
+
+def index_path(path):
+    """ Returns the path of the sidecar index file of the log file path. """
+
+    return path + index_extension
+
+
+def _typed_array(typecode, data=b''):
+
+    values = array.array(typecode)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        # Python 2
+        values.fromstring(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _array_bytes(values):
+
+    if sys.byteorder != 'little':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    # Python 2
+    return values.tostring()
+
+
+class DumpIndex(object):
+
+    """ Index of all hex dump lines of a log file.
+
+    For every line matching the dump regex of a HexFilterLinux (or one of
+    the filters in hexfilter.formats with one dump per line), the index
+    holds the byte offset of the line, the log timestamp (NaN if the log has
+    no timestamps), the dump description and the dump address. The
+    descriptions are stored once in descs and referenced by their position.
+
+    An index is only valid for the same file contents (size and mtime) and
+    the same dump regex (see is_valid). Use open_index to get a valid index
+    for a log file.
+    """
+
+    def __init__(self, source_size, source_mtime, pattern):
+        """ DumpIndex constructor
+
+        Arguments:
+        source_size  -- (int) Size of the indexed file
+        source_mtime -- (float) Modification time of the indexed file
+        pattern      -- (string) Dump regex pattern used for building the
+                        index
+        """
+        self.source_size = source_size
+        self.source_mtime = source_mtime
+        self.pattern = pattern
+        self.descs = []
+        self.offsets = _typed_array('Q')
+        self.timestamps = _typed_array('d')
+        self.desc_indexes = _typed_array('I')
+        self.addrs = _typed_array('Q')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, path, hf):
+        """ Builds the index of the log file path in one pass.
+        hf (a HexFilterLinux) selects the log format.
+        """
+
+        if hf.bytes_dump_regex is None:
+            raise ValueError("{} can't be used for indexing".format(
+                type(hf).__name__))
+
+        st = os.stat(path)
+        index = cls(st.st_size, st.st_mtime, hf.dump_regex.pattern)
+        if st.st_size == 0:
+            return index
+
+        desc_map = {}
+        search_marker = hf.bytes_marker_regex.search
+        match = hf.bytes_dump_regex.match
+        has_ts = hf.log_has_timestamps
+        nan = float('nan')
+
+        with open(path, "rb") as fp:
+            data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                search_pos = 0
+                while True:
+                    marker = search_marker(data, search_pos)
+                    if marker is None:
+                        break
+                    marker_pos = marker.start()
+                    line_start = find_line_start(data, marker_pos)
+                    line_end = find_line_end(data, marker_pos)
+                    search_pos = line_end + 1
+
+                    dump_match = match(data, line_start, line_end)
+                    if dump_match is None:
+                        continue
+                    groups = dump_match.groups()
+
+                    if has_ts:
+                        ts = float(groups[0])
+                        groups = groups[1:]
+                    else:
+                        ts = nan
+                    desc = decode_line(groups[0])
+                    desc_idx = desc_map.get(desc)
+                    if desc_idx is None:
+                        desc_idx = desc_map[desc] = len(index.descs)
+                        index.descs.append(desc)
+
+                    index.offsets.append(line_start)
+                    index.timestamps.append(ts)
+                    index.desc_indexes.append(desc_idx)
+                    index.addrs.append(int(groups[1], 16))
+            finally:
+                data.close()
+
+        return index
+
+    def is_valid(self, path, hf):
+        """ Returns True if the index is up to date for the log file path
+        and can be used with hf. """
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return st.st_size == self.source_size and \
+            st.st_mtime == self.source_mtime and \
+            hf.dump_regex.pattern == self.pattern
+
+    def save(self, index_file):
+        """ Writes the index to the file index_file. """
+
+        pattern = self.pattern.encode('utf-8')
+        with open(index_file, "wb") as fp:
+            fp.write(index_header.pack(index_magic, self.source_size,
+                                       self.source_mtime, len(self),
+                                       len(self.descs), len(pattern)))
+            fp.write(pattern)
+            for desc in self.descs:
+                desc = desc.encode('utf-8')
+                fp.write(_desc_length.pack(len(desc)))
+                fp.write(desc)
+            for values in (self.offsets, self.timestamps, self.desc_indexes,
+                           self.addrs):
+                fp.write(_array_bytes(values))
+
+    @classmethod
+    def load(cls, index_file):
+        """ Reads an index written by save. Raises ValueError if index_file
+        is not a valid index file. """
+
+        with open(index_file, "rb") as fp:
+            header = fp.read(index_header.size)
+            if len(header) != index_header.size:
+                raise ValueError("{}: Truncated index file".format(index_file))
+            magic, size, mtime, count, desc_count, pattern_len = \
+                index_header.unpack(header)
+            if magic != index_magic:
+                raise ValueError("{}: Not an index file".format(index_file))
+
+            index = cls(size, mtime, fp.read(pattern_len).decode('utf-8'))
+            for _ in range(desc_count):
+                desc_len, = _desc_length.unpack(fp.read(_desc_length.size))
+                index.descs.append(fp.read(desc_len).decode('utf-8'))
+            index.offsets = _typed_array('Q', fp.read(count * 8))
+            index.timestamps = _typed_array('d', fp.read(count * 8))
+            index.desc_indexes = _typed_array('I', fp.read(count * 4))
+            index.addrs = _typed_array('Q', fp.read(count * 8))
+
+        if len(index.addrs) != count:
+            raise ValueError("{}: Truncated index file".format(index_file))
+        return index
+
+    def window(self, hf):
+        """ Returns the range (start, end) of positions in the index of the
+        dump lines within the time window of hf (see HexFilter start_ts and
+        end_ts). The range is found with a binary search, assuming increasing
+        log timestamps. """
+
+        start = 0
+        end = len(self)
+        if hf.log_has_timestamps:
+            if hf.start_ts is not None:
+                start = bisect_left(self.timestamps, hf.start_ts)
+            if hf.end_ts is not None:
+                end = max(start, bisect_right(self.timestamps, hf.end_ts))
+        return start, end
+
+    def select(self, hf):
+        """ Returns the positions (in the index) of all dump lines within the
+        time window of hf with a description passing the description filter
+        of hf. The filter is only evaluated once for every distinct
+        description. """
+
+        start, end = self.window(hf)
+        if hf.dump_desc_filter is None:
+            return range(start, end)
+
+        selected_descs = set(i for i, desc in enumerate(self.descs)
+                             if hf.dump_desc_filter(desc))
+        desc_indexes = self.desc_indexes
+        return [i for i in range(start, end)
+                if desc_indexes[i] in selected_descs]
+
+
+def open_index(path, hf, index_file=None):
+    """ Returns a valid index for the log file path.
+
+    The index is read from index_file (default index_path(path)) if it is up
+    to date. Otherwise, a new index is built and written to index_file.
+    """
+
+    if index_file is None:
+        index_file = index_path(path)
+
+    try:
+        index = DumpIndex.load(index_file)
+    except (IOError, OSError, ValueError, struct.error):
+        index = None
+
+    if index is None or not index.is_valid(path, hf):
+        index = DumpIndex.build(path, hf)
+        index.save(index_file)
+    return index
+
+
+def filter_indexed(hf, path, index, get_output=None):
+    """ Filters the log file path with hf using index and yields the output in
+    the same way as HexFilter.filter_bytes.
+
+    Only the dump lines selected by the description filter of hf are read and
+    parsed. The output is the same as when filtering the whole file, except
+    that non hex lines before and after each dump
+    (keep_n_lines_before_each_dump and keep_n_lines_after_each_dump) are not
+    supported.
+    """
+
+    if hf.keep_n_lines_before_each_dump > 0 or \
+       hf.keep_n_lines_after_each_dump > 0:
+        raise ValueError("Non hex lines before or after dumps can't be "
+                         "filtered with an index")
+
+    if get_output is None:
+        get_output = hf.get_output
+        encode = True
+    else:
+        encode = False
+
+    if len(index) == 0:
+        return
+
+    parse_line = hf.parse_line
+    timestamps = index.timestamps
+    offsets = index.offsets
+    update_prev_ts = hf.log_has_timestamps and not hf.skip_timestamps
+    window_start, _ = index.window(hf)
+
+    with open(path, "rb") as fp:
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for i in index.select(hf):
+                if update_prev_ts:
+                    # Delta times are relative to the previous dump line in
+                    # the log (within the time window), even if that line
+                    # was filtered out
+                    if i > window_start:
+                        hf.prev_ts = timestamps[i - 1]
+                    else:
+                        hf.prev_ts = None
+
+                offset = offsets[i]
+                line_end = find_line_end(data, offset)
+                if not parse_line(decode_line(data[offset:line_end])):
+                    continue
+
+                output = get_output()
+                if output is None:
+                    continue
+                if encode:
+                    output = output.encode('utf-8')
+                yield output
+        finally:
+            data.close()
@@ -0,0 +1,226 @@
+import multiprocessing
+
+from .hexfilter import HexFilterLinux, find_line_end, find_line_start
+
+# Size (in bytes) of the chunks a file is split into by filter_file_parallel
+default_chunk_size = 16 << 20
+
+# Initial size (in bytes) of the window before each chunk used for priming
+# the filter state (see _prime_filter). The window grows until the state is
+# known to be the same as in a serial run. Also the size of the blocks
+# searched by _last_dump_ts.
+prime_window_size = 64 << 10
+
+
+def _chunk_offsets(fp, size, chunk_size):
+    """ Splits a file into chunks of (approximately) chunk_size bytes.
+    Each chunk starts at the beginning of a line.
+
+    Returns a list of (start, end) offset tuples.
+    """
+
+    offsets = [0]
+    pos = chunk_size
+    while pos < size:
+        # Find the first line start at or after pos
+        fp.seek(pos - 1)
+        pos += len(fp.readline()) - 1
+        if pos >= size:
+            break
+        offsets.append(pos)
+        pos += chunk_size
+    offsets.append(size)
+
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def _uses_prev_ts(hf):
+    """ Returns True if the output of hf depends on the timestamp of the
+    previous dump (delta times). """
+
+    return hf.log_has_timestamps and not hf.skip_timestamps and \
+        not hf.abs_timestamps
+
+
+def _last_dump_ts(args):
+    """ Returns the log timestamp of the last dump line within the time window
+    of the filter (see HexFilter.ts_in_window) in a chunk of the file, or None
+    if the chunk has no such line. This is the timestamp of the previous dump
+    (HexFilter.prev_ts) for the dumps after the chunk.
+
+    The chunk is searched backwards in blocks, so usually only the end of the
+    chunk is read.
+    """
+
+    path, start, end, filter_class, filter_kwargs = args
+    hf = filter_class(**filter_kwargs)
+    search_marker = hf.bytes_marker_regex.search
+    match = hf.bytes_dump_regex.match
+    block_size = prime_window_size
+
+    with open(path, "rb") as fp:
+        while end > start:
+            block_start = max(start, end - block_size)
+            fp.seek(block_start)
+            data = fp.read(end - block_start)
+            first_line = 0
+            if block_start > start:
+                # Skip the first line since it might be incomplete. It is
+                # searched with the next block.
+                first_line = find_line_end(data, 0) + 1
+                if first_line >= len(data):
+                    # A line longer than the block
+                    block_size *= 2
+                    continue
+
+            ts = None
+            pos = first_line
+            while True:
+                marker = search_marker(data, pos)
+                if marker is None:
+                    break
+                marker_pos = marker.start()
+                line_end = find_line_end(data, marker_pos)
+                dump_match = match(data, find_line_start(data, marker_pos),
+                                   line_end)
+                if dump_match is not None and \
+                   hf.ts_in_window(dump_match.group(1)):
+                    ts = float(dump_match.group(1))
+                pos = line_end + 1
+            if ts is not None:
+                return ts
+            end = block_start + first_line if block_start > start else start
+
+    return None
+
+
+def _is_primed(hf, dump_found):
+    """ Returns True if the non hex lines stored by a filter that has parsed
+    the lines before a chunk are the same as if it had parsed the whole file
+    up to the chunk. The timestamp of the previous dump is set separately,
+    see _last_dump_ts.
+    """
+
+    # Without a dump in the window, the first keep_n_lines_after_each_dump
+    # non hex lines of the window might belong after a dump before the
+    # window. Only the keep_n_lines_before_each_dump lines following them
+    # are known to be stored before the next dump, so the window must
+    # contain both before the state is the same as in a serial run.
+    context_lines = hf.keep_n_lines_before_each_dump + \
+        hf.keep_n_lines_after_each_dump
+    if context_lines > 0 and not dump_found and \
+       hf.lines_seen - hf.regex_matched < context_lines:
+        return False
+
+    return True
+
+
+def _prime_filter(fp, filter_class, filter_kwargs, start):
+    """ Creates a filter in the same state as a filter that has parsed
+    everything before the offset start.
+
+    The non hex lines stored before the next dump (and after the previous
+    dump) only depend on a limited number of lines before start, so only a
+    window of the file before start is parsed. The window is enlarged until
+    it is large enough. The timestamp of the previous dump might be far
+    before start, it is found by _last_dump_ts.
+    """
+
+    window_size = prime_window_size
+    while True:
+        hf = filter_class(**filter_kwargs)
+        if start == 0:
+            return hf
+
+        window_start = max(0, start - window_size)
+        fp.seek(window_start)
+        window = fp.read(start - window_start)
+        if window_start > 0:
+            # Skip the first line since it might be incomplete
+            line_end = window.find(b'\n')
+            if line_end < 0:
+                window_size *= 4
+                continue
+            window = window[line_end + 1:]
+
+        dump_found = False
+        for _ in hf.filter_bytes(window):
+            dump_found = True
+
+        if window_start == 0 or _is_primed(hf, dump_found):
+            return hf
+        window_size *= 4
+
+
+def _filter_chunk(args):
+
+    path, start, end, filter_class, filter_kwargs, prev_ts = args
+    with open(path, "rb") as fp:
+        hf = _prime_filter(fp, filter_class, filter_kwargs, start)
+        if _uses_prev_ts(hf):
+            hf.prev_ts = prev_ts
+        fp.seek(start)
+        data = fp.read(end - start)
+
+    return b''.join(hf.filter_bytes(data))
+
+
+def filter_file_parallel(path, outfp, jobs,
+                         filter_class=HexFilterLinux,
+                         filter_kwargs=None,
+                         chunk_size=default_chunk_size):
+    """ Filters the file path using a pool of jobs worker processes and writes
+    the output to outfp (a file opened in binary mode).
+
+    The file is split into chunks at line boundaries. Each chunk is filtered
+    by its own filter_class instance (created with filter_kwargs) and the
+    filtered chunks are written in the original order. The output is the
+    same as when filtering the whole file with a single filter.
+
+    With delta times, the timestamp of the last dump in each chunk is looked
+    up first (see _last_dump_ts), so that each chunk starts with the same
+    previous timestamp as in a serial run.
+
+    Keyword arguments:
+    filter_class  -- (class) HexFilter class used for filtering
+                     (default HexFilterLinux)
+    filter_kwargs -- (dict) Constructor arguments for filter_class
+                     (default None)
+    chunk_size    -- (int) Approximate chunk size in bytes
+                     (default 16 MiB)
+    """
+
+    if filter_kwargs is None:
+        filter_kwargs = {}
+    hf = filter_class(**filter_kwargs)
+    if hf.bytes_dump_regex is None:
+        raise ValueError("{} can't be used for filtering in parallel".format(
+            filter_class.__name__))
+
+    with open(path, "rb") as fp:
+        fp.seek(0, 2)
+        size = fp.tell()
+        chunks = _chunk_offsets(fp, size, chunk_size)
+
+    tasks = [(path, start, end, filter_class, filter_kwargs)
+             for start, end in chunks]
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        last_ts = [None] * len(tasks)
+        if _uses_prev_ts(hf):
+            last_ts = pool.map(_last_dump_ts, tasks)
+        prev_ts = None
+        for i, task in enumerate(tasks):
+            tasks[i] = task + (prev_ts,)
+            if last_ts[i] is not None:
+                prev_ts = last_ts[i]
+
+        for output in pool.imap(_filter_chunk, tasks):
+            outfp.write(output)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
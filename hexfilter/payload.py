@@ -0,0 +1,171 @@
+import struct
+from collections import namedtuple
+
+# A payload assembled from a burst of hex dump lines.
+#
+# ts   -- Absolute timestamp of the first line in the burst (or None if the
+#         log has no timestamps or they are skipped)
+# desc -- Description string of the dump
+# addr -- Address/offset of the first line in the burst
+# data -- Payload bytes
+HexPayload = namedtuple('HexPayload', ['ts', 'desc', 'addr', 'data'])
+
+# Header of each record written by write_payload_records:
+# timestamp (double, NaN if not available), address (64 bit), payload length
+# and description length, all little endian. The header is followed by the
+# UTF-8 encoded description and the payload bytes.
+payload_record_header = struct.Struct('<dQIH')
+
+
+class PayloadAssembler(object):
+
+    """ Assembles the data of consecutive hex dump lines into payloads.
+
+    A burst of hex dump lines (and hence a payload) consists of lines with
+    the same description where the address of each line continues where the
+    previous line ended. A new burst is started when the description changes
+    or the address is not contiguous (e.g. when it starts over at 00000000).
+    """
+
+    def __init__(self, hf):
+        """ PayloadAssembler constructor
+
+        Arguments:
+        hf -- (HexFilterLinux) The filter used for parsing the log
+        """
+        self.hf = hf
+        self.ts = None
+        self.desc = None
+        self.addr = None
+        self.next_addr = None
+        self.data = bytearray()
+
+    def add_dump(self):
+        """ Adds the data of the most recently parsed hex dump of the filter.
+
+        If the dump starts a new burst, the payload of the previous burst is
+        returned. Otherwise, None is returned.
+
+        This method can be used as the get_output argument of the filter
+        methods (parse_lines, filter_buffer etc.) in order to get a payload
+        instead of a line of text for each burst.
+        """
+
+        return self.add_data(self.hf.get_hex_bytes())
+
+    def add_data(self, data):
+        """ Same as add_dump, but for data already converted with
+        get_hex_bytes of the filter (None if it can't be converted, in which
+        case the dump is skipped).
+        """
+
+        if data is None:
+            return None
+
+        hf = self.hf
+        addr = int(hf.dump_addr, 16)
+        payload = None
+        if addr != self.next_addr or hf.cur_dump_desc != self.desc:
+            payload = self.flush()
+            if hf.log_has_timestamps and not hf.skip_timestamps:
+                self.ts = hf.ts
+            self.desc = hf.cur_dump_desc
+            self.addr = addr
+
+        self.data += data
+        self.next_addr = addr + len(data)
+
+        return payload
+
+    def flush(self):
+        """ Returns the payload of the current burst (or None if there is no
+        current burst) and starts over with an empty burst.
+        """
+
+        if self.addr is None:
+            return None
+
+        payload = HexPayload(self.ts, self.desc, self.addr, bytes(self.data))
+        self.ts = None
+        self.desc = None
+        self.addr = None
+        self.next_addr = None
+        self.data = bytearray()
+
+        return payload
+
+    def payloads(self, outputs):
+        """ Yields all payloads from outputs (the output of a filter method
+        using add_dump as get_output) followed by the last payload.
+        """
+
+        for payload in outputs:
+            yield payload
+
+        payload = self.flush()
+        if payload is not None:
+            yield payload
+
+
+def iter_payloads(hf, fp):
+    """ Filters the file object fp (opened in text mode) with hf and yields a
+    HexPayload for each burst of hex dumps.
+    """
+
+    assembler = PayloadAssembler(hf)
+    return assembler.payloads(hf.filter_file(fp, get_output=assembler.add_dump))
+
+
+def iter_payloads_bytes(hf, data):
+    """ Same as iter_payloads, but for bytes like objects (see
+    HexFilterLinux.filter_bytes).
+    """
+
+    assembler = PayloadAssembler(hf)
+    return assembler.payloads(hf.filter_bytes(data, get_output=assembler.add_dump))
+
+
+def write_payloads_raw(outfp, payloads):
+    """ Writes the data of all payloads to outfp (opened in binary mode)
+    without any separation between the payloads.
+    """
+
+    for payload in payloads:
+        outfp.write(payload.data)
+
+
+def pack_payload_record(payload):
+    """ Returns a length prefixed binary record for payload. """
+
+    desc = payload.desc.encode('utf-8')
+    ts = payload.ts if payload.ts is not None else float('nan')
+    return b''.join((payload_record_header.pack(ts, payload.addr,
+                                                len(payload.data), len(desc)),
+                     desc, payload.data))
+
+
+def write_payload_records(outfp, payloads):
+    """ Writes all payloads to outfp (opened in binary mode) as length
+    prefixed binary records (see payload_record_header).
+    """
+
+    for payload in payloads:
+        outfp.write(pack_payload_record(payload))
+
+
+def read_payload_records(fp):
+    """ Reads records written by write_payload_records from fp (opened in
+    binary mode) and yields a HexPayload for each record.
+    """
+
+    while True:
+        header = fp.read(payload_record_header.size)
+        if len(header) < payload_record_header.size:
+            break
+        ts, addr, data_len, desc_len = payload_record_header.unpack(header)
+        if ts != ts:
+            # NaN, no timestamp
+            ts = None
+        desc = fp.read(desc_len).decode('utf-8')
+        data = fp.read(data_len)
+        yield HexPayload(ts, desc, addr, data)
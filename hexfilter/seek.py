@@ -0,0 +1,92 @@
+import mmap
+import os
+
+from .hexfilter import find_line_end, find_line_start
+
+
+def _first_dump_ts(data, pos, search_marker, match):
+    """ Returns (next_line, ts) of the first hex dump line starting at or
+    after pos in data, where next_line is the start of the line after it, or
+    None if there are no more dump lines. """
+
+    data_len = len(data)
+    if pos > 0:
+        # Skip to the start of the next line, unless pos is a line start
+        pos = find_line_end(data, pos - 1) + 1
+        if pos > data_len:
+            return None
+
+    while True:
+        marker = search_marker(data, pos)
+        if marker is None:
+            return None
+        marker_pos = marker.start()
+        line_start = find_line_start(data, marker_pos)
+        line_end = find_line_end(data, marker_pos)
+        if line_start >= pos:
+            dump_match = match(data, line_start, line_end)
+            if dump_match is not None:
+                if data[line_end:line_end + 2] == b'\r\n':
+                    line_end += 1
+                return line_end + 1, float(dump_match.group(1))
+        pos = line_end + 1
+
+
+def _skip_back_non_hex_lines(data, pos, num_lines, match):
+    """ Returns the start of the line num_lines non hex lines before pos,
+    so that the non hex lines stored before the first dump (see
+    keep_n_lines_before_each_dump) are the same as in a full scan. """
+
+    while num_lines > 0 and pos > 0:
+        # End of the previous line, without its line ending
+        line_end = pos - 1
+        if line_end > 0 and data[line_end - 1:line_end + 1] == b'\r\n':
+            line_end -= 1
+        line_start = find_line_start(data, line_end)
+        if match(data, line_start, line_end) is None:
+            num_lines -= 1
+        pos = line_start
+    return pos
+
+
+def find_start_offset(fp, hf):
+    """ Returns the offset of the line in fp (a seekable file opened in binary
+    mode) where filtering with the time window of hf (see HexFilter start_ts)
+    should start.
+
+    The offset is found with a binary search over the log timestamps of the
+    hex dump lines, so only a few lines of the file are parsed. The log
+    timestamps are assumed to be increasing. Returns 0 if hf has no start_ts.
+    """
+
+    if hf.start_ts is None or not hf.log_has_timestamps or \
+       hf.bytes_dump_regex is None:
+        return 0
+
+    size = os.fstat(fp.fileno()).st_size
+    if size == 0:
+        return 0
+
+    search_marker = hf.bytes_marker_regex.search
+    match = hf.bytes_dump_regex.match
+    data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        # All dumps before lo are known to be before start_ts
+        lo = 0
+        hi = size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            dump = _first_dump_ts(data, mid, search_marker, match)
+            if dump is None or dump[1] >= hf.start_ts:
+                hi = mid
+            else:
+                lo = dump[0]
+
+        if hf.keep_n_lines_before_each_dump > 0:
+            lo = _skip_back_non_hex_lines(data, lo,
+                                          hf.keep_n_lines_before_each_dump,
+                                          match)
+    finally:
+        data.close()
+
+    return lo
@@ -0,0 +1,113 @@
+import json
+import time
+from collections import OrderedDict
+
+# Clock used for timing the stages (time.perf_counter is not available in
+# Python 2)
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Stages timed by time_stages:
+#
+# match    -- Pre-filter and dump regex matching
+# desc     -- Description filtering (dump_desc and dump_desc_invert)
+# validate -- Validation of the characters of the hex and ASCII parts
+# format   -- Formatting of the output (get_hex, get_record, get_hex_bytes)
+stages = ('match', 'desc', 'validate', 'format')
+
+# Filter attributes timed as each stage. Attributes that don't exist or are
+# None (e.g. dump_desc_reject without description filtering) are skipped.
+_stage_regexes = ('marker_regex', 'dump_regex', 'bytes_marker_regex',
+                  'bytes_dump_regex', 'data_regex')
+_stage_functions = (
+    ('desc', ('dump_desc_reject',)),
+    ('validate', ('invalid_hex_data_char', 'invalid_ascii_char')),
+    ('format', ('get_hex', 'get_record', 'get_hex_bytes')),
+)
+
+
+def _timed(func, times, stage):
+
+    def timed(*args):
+        start = _clock()
+        result = func(*args)
+        times[stage] += _clock() - start
+        return result
+
+    return timed
+
+
+class _TimedRegex(object):
+
+    """ Wraps a compiled regex so that the time spent in search and match
+    is added to a stage. All other attributes are the ones of the regex.
+    """
+
+    def __init__(self, regex, times, stage):
+        self.regex = regex
+        self.search = _timed(regex.search, times, stage)
+        self.match = _timed(regex.match, times, stage)
+
+    def __getattr__(self, name):
+        return getattr(self.regex, name)
+
+
+def time_stages(hf):
+    """ Replaces the regexes and the methods of each stage of the filter hf
+    with versions that measure the time spent in them, and returns the
+    OrderedDict (stage -> seconds) the times are added to.
+
+    The wrappers are set as instance attributes, so filters that are not
+    timed are not affected at all.
+    """
+
+    times = OrderedDict((stage, 0.0) for stage in stages)
+
+    for name in _stage_regexes:
+        regex = getattr(hf, name, None)
+        if regex is not None:
+            setattr(hf, name, _TimedRegex(regex, times, 'match'))
+
+    for stage, names in _stage_functions:
+        for name in names:
+            func = getattr(hf, name, None)
+            if func is not None:
+                setattr(hf, name, _timed(func, times, stage))
+
+    return times
+
+
+def format_stats(stats, seconds=None):
+    """ Returns a text summary of stats (see HexFilterLinux.get_stats), one
+    counter or stage time per line. If seconds (the total time of the run)
+    is given, it is added along with the time not spent in any of the timed
+    stages.
+    """
+
+    lines = ['{:<24} {:>12}'.format(name, value)
+             for name, value in stats.items() if name != 'stage_times']
+
+    stage_times = stats.get('stage_times')
+    if stage_times is not None:
+        for stage, stage_seconds in stage_times.items():
+            lines.append('{:<24} {:>12.3f} s'.format('time_' + stage,
+                                                     stage_seconds))
+        if seconds is not None:
+            lines.append('{:<24} {:>12.3f} s'.format(
+                'time_other', seconds - sum(stage_times.values())))
+    if seconds is not None:
+        lines.append('{:<24} {:>12.3f} s'.format('time_total', seconds))
+
+    return ''.join(line + '\n' for line in lines)
+
+
+def write_stats_json(fp, stats, seconds=None):
+    """ Writes stats (see HexFilterLinux.get_stats) as a JSON object to the
+    file object fp (opened in text mode). If seconds is given, it is added as
+    'seconds'.
+    """
+
+    stats = OrderedDict(stats)
+    if seconds is not None:
+        stats['seconds'] = seconds
+    json.dump(stats, fp, indent=2)
+    fp.write('\n')
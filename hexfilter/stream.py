@@ -0,0 +1,163 @@
+import itertools
+import os
+import select
+import stat
+import time
+
+# Number of bytes read from the input in each read call by read_chunks
+default_read_size = 1 << 16
+
+# Time (in seconds) to wait before checking a followed file for new data
+default_poll_interval = 0.1
+
+
+def _input_ready(fd, regular):
+    """ Returns True if there is data that can be read from fd without
+    blocking. """
+
+    if regular:
+        return os.lseek(fd, 0, os.SEEK_CUR) < os.fstat(fd).st_size
+    readable, _, _ = select.select([fd], [], [], 0)
+    return bool(readable)
+
+
+def read_chunks(fd, follow=False, poll_interval=default_poll_interval,
+                read_size=default_read_size, on_idle=None):
+    """ Reads the file descriptor fd and yields the data (bytes) as soon as it
+    is available, i.e. without waiting for a full buffer.
+
+    Keyword arguments:
+    follow        -- (bool) If fd is a regular file, keep waiting for more
+                     data at the end of the file (like tail -f). If the file
+                     is truncated, reading starts over from the beginning.
+                     (default False)
+    poll_interval -- (float) Time in seconds between checks for new data
+                     when following a file (default 0.1)
+    read_size     -- (int) Maximum number of bytes read at a time
+                     (default 64 KiB)
+    on_idle       -- (callable) Called before waiting for more input, e.g.
+                     for flushing pending output (default None)
+    """
+
+    regular = stat.S_ISREG(os.fstat(fd).st_mode)
+    while True:
+        if on_idle is not None and not _input_ready(fd, regular):
+            on_idle()
+
+        data = os.read(fd, read_size)
+        if data:
+            yield data
+            continue
+
+        if not follow or not regular:
+            # End of file or pipe closed
+            break
+
+        time.sleep(poll_interval)
+        if os.fstat(fd).st_size < os.lseek(fd, 0, os.SEEK_CUR):
+            # The file has been truncated
+            os.lseek(fd, 0, os.SEEK_SET)
+
+
+def read_lines(chunks):
+    """ Combines the data chunks from read_chunks into blocks of complete
+    lines. A trailing incomplete line is yielded when the input ends.
+
+    Lines end with \n, \r\n or \r (see HexFilterLinux.filter_bytes). A \r
+    at the end of a chunk is kept for the next block, since it might be
+    followed by a \n.
+    """
+
+    remainder = b''
+    for data in chunks:
+        if remainder:
+            data = remainder + data
+        line_end = data.rfind(b'\n')
+        line_end = max(line_end, data.rfind(b'\r', line_end + 1, -1))
+        if line_end < 0:
+            remainder = data
+            continue
+        remainder = data[line_end + 1:]
+        yield data[:line_end + 1]
+
+    if remainder:
+        yield remainder
+
+
+class FlushingWriter(object):
+
+    """ Output writer for streaming (live) filtering.
+
+    The output is flushed when the input is idle (see read_chunks), so every
+    filtered dump is written as soon as its line has been read. When there is
+    a steady stream of input, the output is flushed after every block of
+    input, or less frequently if flush_interval or flush_records are set.
+    """
+
+    def __init__(self, fp, flush_interval=0.0, flush_records=0):
+        """ FlushingWriter constructor
+
+        Arguments:
+        fp -- Output file object
+
+        Keyword arguments:
+        flush_interval -- (float) Minimum time in seconds between two flushes
+                          as long as there is more input to read
+                          (default 0.0, flush after every block of input)
+        flush_records  -- (int) Flush when this many output records are
+                          pending, regardless of flush_interval
+                          (default 0, no limit)
+        """
+        self.fp = fp
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.pending = 0
+        self.last_flush = time.time()
+
+    def write(self, outputs):
+        """ Writes all output records (strings or bytes) in outputs. """
+
+        write = self.fp.write
+        for output in outputs:
+            write(output)
+            self.pending += 1
+            if self.flush_records and self.pending >= self.flush_records:
+                self.flush()
+
+        if self.pending and \
+           time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """ Flushes pending output. """
+
+        if self.pending:
+            self.fp.flush()
+            self.pending = 0
+        self.last_flush = time.time()
+
+
+def filter_stream(hf, fd, outfp, follow=False,
+                  poll_interval=default_poll_interval,
+                  flush_interval=0.0, flush_records=0, initial_data=b''):
+    """ Filters the input file descriptor fd with hf as data arrives and
+    writes the output to outfp (opened in binary mode).
+
+    initial_data is filtered before the data read from fd. It is used for
+    input that has already been read from fd into the buffer of a file
+    object (e.g. by peeking at sys.stdin.buffer).
+
+    See read_chunks and FlushingWriter for a description of the other
+    arguments.
+    """
+
+    writer = FlushingWriter(outfp, flush_interval, flush_records)
+    chunks = read_chunks(fd, follow=follow, poll_interval=poll_interval,
+                         on_idle=writer.flush)
+    if initial_data:
+        chunks = itertools.chain([initial_data], chunks)
+    for block in read_lines(chunks):
+        writer.write(hf.filter_bytes(block))
+        if hf.end_ts_passed:
+            break
+    writer.flush()
@@ -0,0 +1,192 @@
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from array import array
+
+from hexfilter import HexFilterLinux
+from hexfilter.columnar import export_format_from_name, export_records, \
+    raw_columns
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def _log_lines():
+    """ Returns the lines of a log with dump lines of different lengths and
+    descriptions. """
+
+    descs = ('sdio wr', 'sdio rd', 'htc rx')
+    lines = []
+    for i in range(30):
+        ts = 10.0 + i
+        for offset in range(0, 24 + i % 9, 16):
+            length = min(16, 24 + i % 9 - offset)
+            lines.append('[%12.6f] %s %08x: %s  %s\n' %
+                         (ts + offset / 1000000.0, descs[i % 3], offset,
+                          ' '.join('%02x' % ((i + offset + j) & 0xff)
+                                   for j in range(length)),
+                          '.' * length))
+        lines.append('[%12.6f] L%d\n' % (ts + 0.5, i))
+    return lines
+
+
+def _records(**filter_kwargs):
+
+    hf = HexFilterLinux(**filter_kwargs)
+    return list(hf.parse_records(_log_lines()))
+
+
+def _none_to_nan(value):
+
+    return float('nan') if value is None else value
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def export(self, name, export_format, records):
+
+        path = os.path.join(self.tmp_dir, name)
+        # A small chunk size, so that several chunks are written
+        self.assertEqual(export_records(records, path, export_format,
+                                        chunk_size=7), len(records))
+        return path
+
+    def assert_same_floats(self, values, expected):
+
+        self.assertEqual(len(values), len(expected))
+        for value, expected_value in zip(values, expected):
+            if math.isnan(expected_value):
+                self.assertTrue(math.isnan(value))
+            else:
+                self.assertEqual(value, expected_value)
+
+    def assert_same_columns(self, columns, records, null_ts):
+        """ Compares columns (a dict of lists, with the descriptions as
+        strings and the payloads as bytes) with records. """
+
+        def ts_values(values):
+            return [null_ts if value is None else value for value in values]
+
+        self.assertEqual(columns['ts'],
+                         ts_values(record.ts for record in records))
+        self.assertEqual(columns['ts_diff'],
+                         ts_values(record.ts_diff for record in records))
+        self.assertEqual(columns['desc'], [record.desc for record in records])
+        self.assertEqual(columns['addr'], [record.addr for record in records])
+        self.assertEqual(columns['data'],
+                         [bytes(record.get_bytes()) for record in records])
+
+    def test_export_format_from_name(self):
+
+        self.assertEqual(export_format_from_name('a.parquet'), 'parquet')
+        self.assertEqual(export_format_from_name('a.feather'), 'arrow')
+        self.assertEqual(export_format_from_name('a.NPZ'), 'npz')
+        self.assertIn(export_format_from_name('a'), ('parquet', 'npz', 'raw'))
+
+    @unittest.skipUnless(pyarrow, 'requires pyarrow')
+    def test_parquet(self):
+
+        for filter_kwargs in ({}, {'log_has_timestamps': False}):
+            records = _records(**filter_kwargs)
+            path = self.export('dumps.parquet', None, records)
+            table = pyarrow.parquet.read_table(path)
+            self.assertGreater(table.num_rows, 0)
+            self.assert_same_columns(table.to_pydict(), records, None)
+
+    @unittest.skipUnless(pyarrow, 'requires pyarrow')
+    def test_arrow(self):
+
+        records = _records()
+        path = self.export('dumps.arrow', None, records)
+        reader = pyarrow.ipc.open_file(path)
+        self.assertGreater(reader.num_record_batches, 1)
+        self.assert_same_columns(reader.read_all().to_pydict(), records,
+                                 None)
+
+    def read_raw(self, path):
+
+        with open(os.path.join(path, 'columns.json')) as fp:
+            layout = json.load(fp)
+        with open(os.path.join(path, 'descs.json')) as fp:
+            descs = json.load(fp)
+
+        columns = {}
+        for name, typecode, _ in raw_columns:
+            values = array(typecode)
+            with open(os.path.join(path, name + '.bin'), 'rb') as fp:
+                values.frombytes(fp.read())
+            if sys.byteorder == 'big':
+                values.byteswap()
+            columns[name] = list(values)
+        with open(os.path.join(path, 'data.bin'), 'rb') as fp:
+            data = fp.read()
+        return layout['records'], descs, columns, data
+
+    def assert_same_layout(self, descs, columns, data, records):
+        """ Compares the raw (and NPZ) layout with records. """
+
+        offsets = columns['offsets']
+        self.assertEqual(len(offsets), len(records) + 1)
+        self.assertEqual(offsets[-1], len(data))
+        self.assert_same_floats(columns['ts'],
+                                [_none_to_nan(record.ts)
+                                 for record in records])
+        self.assert_same_floats(columns['ts_diff'],
+                                [_none_to_nan(record.ts_diff)
+                                 for record in records])
+        self.assert_same_columns(
+            {'ts': [record.ts for record in records],
+             'ts_diff': [record.ts_diff for record in records],
+             'desc': [descs[desc] for desc in columns['desc']],
+             'addr': columns['addr'],
+             'data': [data[offsets[i]:offsets[i + 1]]
+                      for i in range(len(records))]},
+            records, None)
+
+    def test_raw(self):
+
+        for filter_kwargs in ({}, {'log_has_timestamps': False}):
+            records = _records(**filter_kwargs)
+            path = self.export('dumps', 'raw', records)
+            num_records, descs, columns, data = self.read_raw(path)
+            self.assertEqual(num_records, len(records))
+            self.assertEqual(sorted(descs),
+                             sorted(set(record.desc for record in records)))
+            self.assert_same_layout(descs, columns, data, records)
+
+    @unittest.skipUnless(numpy, 'requires numpy')
+    def test_npz(self):
+
+        records = _records()
+        path = self.export('dumps.npz', None, records)
+        with numpy.load(path) as npz:
+            columns = dict((name, npz[name].tolist())
+                           for name, _, _ in raw_columns)
+            descs = npz['descs'].tolist()
+            data = npz['data'].tobytes()
+        self.assertEqual(os.listdir(self.tmp_dir), ['dumps.npz'])
+        self.assert_same_layout(descs, columns, data, records)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import re
+import unittest
+
+from hexfilter import HexFilterLinux
+from hexfilter.dedup import BurstDeduplicator
+
+# Matches the lines replacing repeated bursts
+repeat_line_regex = re.compile(
+    r'== repeat of line (\d+) \((\d+) bytes\) x (\d+)\n')
+
+
+def _log_lines():
+    """ Returns the lines of a log with bursts of two full dump lines. The
+    data of the bursts is one of a few patterns, so most bursts are repeats,
+    some of them consecutive. """
+
+    lines = []
+    for i in range(60):
+        ts = 10.0 + i
+        pattern = (i // 3) % 4
+        desc = 'sdio wr' if i % 5 else 'htc rx'
+        for offset in range(0, 32, 16):
+            lines.append('[%12.6f] %s %08x: %s  %s\n' %
+                         (ts + offset / 1000000.0, desc, offset,
+                          ' '.join('%02x' % ((pattern * 16 + j) & 0xff)
+                                   for j in range(16)),
+                          '.' * 16))
+        if i % 3 == 0:
+            lines.append('[%12.6f] L%d\n' % (ts + 0.5, i))
+    return lines
+
+
+def _expand_repeats(text):
+    """ Replaces each repeat line of the output of BurstDeduplicator with the
+    lines of the burst it refers to (16 bytes per line). """
+
+    lines = text.splitlines(True)
+    expanded = []
+    for line in lines:
+        repeat = repeat_line_regex.match(line)
+        if repeat is None:
+            expanded.append(line)
+            continue
+        first, size, count = [int(value) for value in repeat.groups()]
+        burst = lines[first - 1:first - 1 + size // 16]
+        expanded.extend(burst * count)
+    return ''.join(expanded)
+
+
+class TestBurstDeduplicator(unittest.TestCase):
+
+    def dedup_output(self, filter_method, data, **filter_kwargs):
+
+        hf = HexFilterLinux(**filter_kwargs)
+        dedup = BurstDeduplicator(hf)
+        outputs = dedup.outputs(getattr(hf, filter_method)(data,
+                                                           dedup.add_dump))
+        return ''.join(outputs), dedup.num_repeats
+
+    def test_same_as_full_scan(self):
+
+        log = ''.join(_log_lines())
+        full = ''.join(HexFilterLinux(skip_timestamps=True)
+                       .filter_buffer(log))
+
+        output, num_repeats = self.dedup_output('filter_buffer', log,
+                                                skip_timestamps=True)
+        self.assertGreater(num_repeats, 10)
+        self.assertLess(len(output), len(full))
+        self.assertEqual(_expand_repeats(output), full)
+
+    def test_bytes_input(self):
+
+        log = ''.join(_log_lines())
+        for filter_kwargs in ({}, {'keep_n_lines_before_each_dump': 1}):
+            self.assertEqual(
+                self.dedup_output('filter_bytes', log.encode('utf-8'),
+                                  **filter_kwargs),
+                self.dedup_output('filter_buffer', log, **filter_kwargs))
+
+    def test_small_cache(self):
+
+        log = ''.join(_log_lines())
+        full = ''.join(HexFilterLinux(skip_timestamps=True)
+                       .filter_buffer(log))
+
+        hf = HexFilterLinux(skip_timestamps=True)
+        dedup = BurstDeduplicator(hf, cache_size=1)
+        output = ''.join(dedup.outputs(hf.filter_buffer(log, dedup.add_dump)))
+        self.assertIn(') x 2\n', output)
+        self.assertEqual(_expand_repeats(output), full)
+
+
+if __name__ == '__main__':
+    unittest.main()
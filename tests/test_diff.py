@@ -0,0 +1,125 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from hexfilter import HexFilterLinux
+from hexfilter.diff import diff_payloads, format_diff, iter_file_payloads
+from hexfilter.payload import HexPayload, iter_payloads
+
+
+def _burst_lines(ts, desc, data):
+
+    lines = []
+    for offset in range(0, len(data), 16):
+        row = bytearray(data[offset:offset + 16])
+        lines.append('[%12.6f] %s %08x: %s  %s\n' %
+                     (ts + offset / 1000000.0, desc, offset,
+                      ' '.join('%02x' % c for c in row), '.' * len(row)))
+    return lines
+
+
+def _bursts():
+    """ Returns (ts, desc, data) of the bursts of a log. """
+
+    return [(10.0 + i, 'sdio wr' if i % 2 else 'htc rx',
+             bytes(bytearray((i * 3 + j) & 0xff for j in range(8 + i % 40))))
+            for i in range(50)]
+
+
+def _log(bursts):
+
+    lines = []
+    for ts, desc, data in bursts:
+        lines.extend(_burst_lines(ts, desc, data))
+        lines.append('[%12.6f] something else\n' % (ts + 0.5))
+    return ''.join(lines)
+
+
+class TestDiff(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def write_log(self, name, log, compress=False):
+
+        path = os.path.join(self.tmp_dir, name)
+        data = log.encode('utf-8')
+        if compress:
+            with gzip.open(path, 'wb') as fp:
+                fp.write(data)
+        else:
+            with open(path, 'wb') as fp:
+                fp.write(data)
+        return path
+
+    def test_payloads_same_as_full_scan(self):
+
+        log = _log(_bursts())
+        full = list(iter_payloads(HexFilterLinux(), io.StringIO(log)))
+        self.assertEqual([payload.data for payload in full],
+                         [data for _, _, data in _bursts()])
+
+        for name, compress in (('a.log', False), ('a.log.gz', True)):
+            path = self.write_log(name, log, compress)
+            self.assertEqual(list(iter_file_payloads(path)), full)
+            self.assertEqual(list(iter_file_payloads(path, 'auto')), full)
+
+    def test_no_differences(self):
+
+        bursts = _bursts()
+        path_a = self.write_log('a.log', _log(bursts))
+        # Same dumps at other times
+        path_b = self.write_log('b.log.gz',
+                                _log([(ts + 100.0, desc, data)
+                                      for ts, desc, data in bursts]), True)
+        self.assertEqual(list(diff_payloads(iter_file_payloads(path_a),
+                                            iter_file_payloads(path_b))), [])
+
+    def test_differences(self):
+
+        bursts = _bursts()
+        changed = list(bursts)
+        ts, desc, data = changed[10]
+        changed[10] = (ts, desc, data[:5] + b'\xff' + data[6:])
+        removed = changed.pop(20)
+        added = (35.5, 'sdio wr', b'\x01\x02\x03')
+        changed.insert(30, added)
+
+        path_a = self.write_log('a.log', _log(bursts))
+        path_b = self.write_log('b.log', _log(changed))
+        diffs = list(diff_payloads(iter_file_payloads(path_a),
+                                   iter_file_payloads(path_b)))
+
+        self.assertEqual([(diff.kind,
+                           (diff.a or diff.b).desc.strip(),
+                           (diff.a or diff.b).data) for diff in diffs],
+                         [('changed', bursts[10][1], bursts[10][2]),
+                          ('removed', removed[1], removed[2]),
+                          ('added', added[1], added[2])])
+        self.assertEqual(diffs[0].b.data, changed[10][2])
+
+    def test_format_diff(self):
+
+        a = HexPayload(1.0, 'sdio wr ', 0, bytes(bytearray(range(40))))
+        b = HexPayload(2.0, 'sdio wr ', 0,
+                       bytes(bytearray(range(16))) + b'\xff' +
+                       bytes(bytearray(range(17, 40))))
+        text = format_diff(next(diff_payloads([a], [b])))
+        self.assertEqual(text.splitlines(), [
+            '@@ sdio wr 00000000 changed [1.000000] -> [2.000000] '
+            '(40 -> 40 bytes)',
+            '-00000010: 10 11 12 13 14 15 16 17 18 19 1a 1b 1c 1d 1e 1f',
+            '+00000010: ff 11 12 13 14 15 16 17 18 19 1a 1b 1c 1d 1e 1f',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import io
+import unittest
+
+from hexfilter.compress import PrefixedReader
+from hexfilter.formats import HexFilterHexdump, HexFilterOd, \
+    HexFilterZephyr, detect_data_format, detect_format, detect_sample_size, \
+    read_sample
+
+# The Zephyr samples of hexfilter.formats, followed by a partial dump line
+zephyr_log = """\
+[00:00:07.852,404] <dbg> sdio: sdio wr
+                                        06 00 00 00 44 12 00 00  08 00 00 00 00 00 00 00 |....D... ........
+                                        01 02 03                                         |...
+[00:00:07.900,000] <inf> main: done
+"""
+
+zephyr_log_no_ts = """\
+<dbg> sdio: sdio wr
+                     06 00 00 00 44 12 00 00  08 00 00 00 00 00 00 00 |....D... ........
+                     01 02 03                                         |...
+<inf> main: done
+"""
+
+zephyr_hex = [
+    '00000000: 06 00 00 00 44 12 00 00 08 00 00 00 00 00 00 00',
+    '00000010: 01 02 03',
+]
+
+
+class TestHexFilterZephyr(unittest.TestCase):
+
+    def filter_log(self, log, **kwargs):
+
+        format_name, format_kwargs = detect_format(log)
+        self.assertEqual(format_name, 'zephyr')
+        format_kwargs.update(kwargs)
+        hf = HexFilterZephyr(**format_kwargs)
+        return list(hf.filter_buffer(log, hf.get_record))
+
+    def test_sample(self):
+
+        records = self.filter_log(zephyr_log, abs_timestamps=True)
+        self.assertEqual(['%08x: %s' % (record.addr, record.data)
+                          for record in records], zephyr_hex)
+        self.assertEqual([record.desc for record in records],
+                         ['sdio: sdio wr'] * 2)
+        self.assertEqual([record.ascii for record in records],
+                         ['....D... ........', '...'])
+        self.assertAlmostEqual(records[0].ts, 7.852404)
+
+    def test_sample_without_timestamps(self):
+
+        records = self.filter_log(zephyr_log_no_ts)
+        self.assertEqual(['%08x: %s' % (record.addr, record.data)
+                          for record in records], zephyr_hex)
+
+    def test_crlf(self):
+
+        records = self.filter_log(zephyr_log.replace('\n', '\r\n'))
+        self.assertEqual(['%08x: %s' % (record.addr, record.data)
+                          for record in records], zephyr_hex)
+
+
+# od -A x -t x1z and hexdump -C dumps of 16 bytes 00..0f, 32 zero bytes,
+# 16 bytes 00..0f and 32 zero bytes
+od_log = """\
+000000 00 01 02 03 04 05 06 07 08 09 0a 0b 0c 0d 0e 0f  >................<
+000010 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00  >................<
+*
+000030 00 01 02 03 04 05 06 07 08 09 0a 0b 0c 0d 0e 0f  >................<
+000040 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00  >................<
+*
+000060
+"""
+
+hexdump_log = """\
+00000000  00 01 02 03 04 05 06 07  08 09 0a 0b 0c 0d 0e 0f  |................|
+00000010  00 00 00 00 00 00 00 00  00 00 00 00 00 00 00 00  |................|
+*
+00000030  00 01 02 03 04 05 06 07  08 09 0a 0b 0c 0d 0e 0f  |................|
+00000040  00 00 00 00 00 00 00 00  00 00 00 00 00 00 00 00  |................|
+*
+00000060
+"""
+
+repeated_data = (bytes(bytearray(range(16))) + b'\0' * 32 +
+                 bytes(bytearray(range(16))) + b'\0' * 32)
+
+
+class TestRepeatedLines(unittest.TestCase):
+
+    def assert_expanded(self, filter_class, log):
+
+        # The '*' lines are expanded across calls as well
+        for lines in (log.splitlines(True), [log]):
+            hf = filter_class()
+            records = []
+            for line in lines:
+                records.extend(hf.filter_buffer(line, hf.get_record))
+            self.assertEqual([record.addr for record in records],
+                             list(range(0, 0x60, 0x10)))
+            self.assertEqual(b''.join(record.get_bytes()
+                                      for record in records),
+                             repeated_data)
+
+    def test_od(self):
+
+        self.assert_expanded(HexFilterOd, od_log)
+
+    def test_hexdump(self):
+
+        self.assert_expanded(HexFilterHexdump, hexdump_log)
+
+    def test_filter_bytes(self):
+
+        hf = HexFilterOd()
+        output = b''.join(hf.filter_bytes(od_log.encode('utf-8')))
+        self.assertEqual(output.count(b'\n'), 6)
+        self.assertNotIn(b'*', output)
+
+
+class _PipeReader(io.RawIOBase):
+
+    """ Returns at most 4 KiB per read, like a pipe. """
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        data = self.data.read(min(len(buf), 4096))
+        buf[:len(data)] = data
+        return len(data)
+
+
+class TestReadSample(unittest.TestCase):
+
+    def test_late_dump(self):
+
+        # The first dump is far beyond the first read of the pipe
+        log = ''.join('[%12.6f] boot line %d\n' % (i / 1000.0, i)
+                      for i in range(1000)) + zephyr_log
+        data = log.encode('utf-8')
+        self.assertLess(len(data), detect_sample_size)
+        fp = io.BufferedReader(_PipeReader(data), 4096)
+
+        sample = read_sample(fp)
+        self.assertEqual(sample, data)
+        self.assertEqual(detect_data_format(sample)[0], 'zephyr')
+        self.assertEqual(PrefixedReader(sample, fp).read(), data)
+
+    def test_prefixed_reader(self):
+
+        data = bytes(bytearray(range(256))) * 1024
+        fp = io.BufferedReader(_PipeReader(data), 4096)
+        sample = read_sample(fp)
+        self.assertEqual(len(sample), detect_sample_size)
+
+        fp = PrefixedReader(sample, fp)
+        chunks = []
+        while True:
+            chunk = fp.read(10000)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.assertEqual(b''.join(chunks), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import io
+import unittest
+
+from hexfilter import HexFilterLinux
+from hexfilter.hexfilter import _universal_newline_blocks
+
+log_lines = [
+    '[    1.000000] boot\n',
+    '[    1.000100] sdio wr 00000000: 06 00 00 00 44 12 00 00  ....D...\n',
+    '[    1.000200] sdio wr 00000008: 08 00 00 00 00 00 00 00  ........\n',
+    '\n',
+    '[    1.500000] wlan0: link becomes ready\n',
+    '[    2.000000] htc rx 00000000: 01 02 03 04 05 06 07 08  ........\n',
+    '[    2.500000] done\n',
+    '[    3.000000] sdio rd 00000000: 41 42 43 44              ABCD',
+]
+
+filter_kwargs = (
+    {},
+    {'abs_timestamps': True, 'keep_n_lines_before_each_dump': 2,
+     'keep_n_lines_after_each_dump': 1},
+)
+
+
+def _text_output(data, **kwargs):
+    """ Returns the output of filter_file for data read in text mode
+    (universal newlines). """
+
+    fp = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+    return ''.join(HexFilterLinux(**kwargs).filter_file(fp))
+
+
+def _bytes_output(data, **kwargs):
+
+    return b''.join(HexFilterLinux(**kwargs).filter_bytes(data)) \
+        .decode('utf-8')
+
+
+class TestLineEndings(unittest.TestCase):
+
+    def assert_same_output(self, newline):
+
+        data = ''.join(log_lines).replace('\n', newline).encode('utf-8')
+        for kwargs in filter_kwargs:
+            expected = _text_output(data, **kwargs)
+            self.assertIn('00000008: 08 00', expected)
+            self.assertEqual(_bytes_output(data, **kwargs), expected)
+            self.assertEqual(_bytes_output(bytearray(data), **kwargs),
+                             expected)
+
+    def test_lf(self):
+
+        self.assert_same_output('\n')
+
+    def test_crlf(self):
+
+        self.assert_same_output('\r\n')
+
+    def test_cr_crlf(self):
+
+        self.assert_same_output('\r\r\n')
+
+    def test_cr(self):
+
+        self.assert_same_output('\r')
+
+    def test_universal_newline_blocks(self):
+
+        data = b'ab\r\ncd\r\r\nef\rgh\n\rij'
+        expected = b'ab\ncd\n\nef\ngh\n\nij'
+        for block_size in range(1, len(data) + 2):
+            blocks = list(_universal_newline_blocks(data, block_size))
+            self.assertEqual(b''.join(blocks), expected)
+            for block in blocks[:-1]:
+                self.assertTrue(block.endswith(b'\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
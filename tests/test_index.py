@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hexfilter import HexFilterLinux
+from hexfilter.index import DumpIndex, filter_indexed, index_path, open_index
+
+
+def _log_lines():
+    """ Returns the lines of a log with dumps of a few descriptions every
+    second, separated by non hex lines. """
+
+    descs = ('sdio wr', 'sdio rd', 'htc rx')
+    lines = []
+    for i in range(40):
+        ts = 10.0 + i
+        for offset in range(0, 32, 16):
+            lines.append('[%12.6f] %s %08x: %s  %s\n' %
+                         (ts + offset / 1000000.0, descs[i % 3], offset,
+                          ' '.join('%02x' % ((i + j) & 0xff)
+                                   for j in range(16)),
+                          '.' * 16))
+        lines.append('[%12.6f] L%d\n' % (ts + 0.5, i))
+    return lines
+
+
+class TestDumpIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'log.txt')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def write_log(self, newline='\n'):
+
+        with open(self.path, 'wb') as fp:
+            fp.write(''.join(_log_lines()).replace('\n', newline)
+                     .encode('utf-8'))
+
+    def assert_same_as_full_scan(self, **filter_kwargs):
+
+        with open(self.path, 'rb') as fp:
+            full = b''.join(HexFilterLinux(**filter_kwargs)
+                            .filter_bytes(fp.read()))
+        self.assertTrue(full)
+
+        hf = HexFilterLinux(**filter_kwargs)
+        index = open_index(self.path, hf)
+        self.assertEqual(b''.join(filter_indexed(hf, self.path, index)), full)
+
+    def test_same_as_full_scan(self):
+
+        self.write_log()
+        for filter_kwargs in ({}, {'abs_timestamps': True},
+                              {'dump_desc': ['sdio']},
+                              {'dump_desc_invert': ['rd']},
+                              {'start_ts': 20.5, 'end_ts': 35.0},
+                              {'dump_desc': ['htc'], 'start_ts': 15.0},
+                              {'skip_timestamps': True,
+                               'include_dump_desc_in_output': True}):
+            self.assert_same_as_full_scan(**filter_kwargs)
+
+    def test_line_endings(self):
+
+        for newline in ('\r\n', '\r'):
+            self.write_log(newline)
+            self.assert_same_as_full_scan(dump_desc=['sdio'])
+
+    def test_save_and_load(self):
+
+        self.write_log()
+        hf = HexFilterLinux()
+        index = open_index(self.path, hf)
+        self.assertEqual(len(index), 80)
+        self.assertTrue(os.path.exists(index_path(self.path)))
+
+        loaded = DumpIndex.load(index_path(self.path))
+        self.assertTrue(loaded.is_valid(self.path, hf))
+        self.assertEqual(loaded.descs, index.descs)
+        self.assertEqual(list(loaded.offsets), list(index.offsets))
+        self.assertEqual(list(loaded.timestamps), list(index.timestamps))
+        self.assertEqual(list(loaded.addrs), list(index.addrs))
+
+    def test_rebuilt_when_stale(self):
+
+        self.write_log()
+        open_index(self.path, HexFilterLinux())
+
+        with open(self.path, 'a') as fp:
+            fp.write('[%12.6f] sdio wr 00000000: ff  .\n' % 60.0)
+        hf = HexFilterLinux()
+        self.assertFalse(DumpIndex.load(index_path(self.path))
+                         .is_valid(self.path, hf))
+        self.assertEqual(len(open_index(self.path, hf)), 81)
+        self.assert_same_as_full_scan()
+
+
+if __name__ == '__main__':
+    unittest.main()
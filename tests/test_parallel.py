@@ -0,0 +1,119 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from hexfilter import HexFilterLinux
+from hexfilter import parallel
+
+
+def _log_lines():
+    """ Returns the lines of a log where the dumps are separated by a few long
+    non hex lines, so that the priming windows of the chunks often contain
+    non hex lines only.
+    """
+
+    lines = []
+    for i in range(40):
+        ts = 100.0 + i
+        for offset in range(0, 32, 16):
+            lines.append('[%12.6f] sdio wr %08x: %s  %s\n' %
+                         (ts + offset / 1000000.0, offset,
+                          ' '.join('%02x' % ((i + j) & 0xff)
+                                   for j in range(16)),
+                          '.' * 16))
+        for j in range(2 + i % 5):
+            lines.append('[%12.6f] L%d.%d %s\n' % (ts + 0.5, i, j, 'x' * 200))
+    return lines
+
+
+def _sparse_log_lines():
+    """ Returns the lines of a log where most chunks have no dumps, so the
+    previous dump of a chunk is often several chunks before it. """
+
+    lines = []
+    for i in range(400):
+        ts = 100.0 + i
+        if i % 150 == 0 or i == 399:
+            lines.append('[%12.6f] htc rx 00000000: %s  %s\n' %
+                         (ts, ' '.join('%02x' % (i & 0xff)
+                                       for _ in range(16)),
+                          '.' * 16))
+        lines.append('[%12.6f] L%d %s\n' % (ts + 0.5, i, 'x' * 40))
+    return lines
+
+
+class TestFilterFileParallel(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'log.txt')
+        with open(self.path, 'w') as fp:
+            fp.writelines(_log_lines())
+        self.prime_window_size = parallel.prime_window_size
+        # A small window makes the window grow for most chunks
+        parallel.prime_window_size = 512
+
+    def tearDown(self):
+
+        parallel.prime_window_size = self.prime_window_size
+        shutil.rmtree(self.tmp_dir)
+
+    def assert_same_as_serial(self, **filter_kwargs):
+
+        with open(self.path, 'rb') as fp:
+            serial = b''.join(HexFilterLinux(**filter_kwargs)
+                              .filter_bytes(fp.read()))
+        self.assertTrue(serial)
+
+        for chunk_size in range(300, 4000, 97):
+            outfp = io.BytesIO()
+            parallel.filter_file_parallel(self.path, outfp, 2,
+                                          filter_kwargs=filter_kwargs,
+                                          chunk_size=chunk_size)
+            self.assertEqual(outfp.getvalue(), serial,
+                             'chunk size %d' % chunk_size)
+
+    def test_sparse_dumps(self):
+
+        with open(self.path, 'w') as fp:
+            fp.writelines(_sparse_log_lines())
+        self.assert_same_as_serial()
+        self.assert_same_as_serial(timestamps_round_us=100,
+                                   keep_n_lines_before_each_dump=1,
+                                   keep_n_lines_after_each_dump=1)
+
+    def test_last_dump_ts(self):
+
+        with open(self.path, 'w') as fp:
+            fp.writelines(_sparse_log_lines())
+        size = os.path.getsize(self.path)
+        # The dumps are at 100, 250, 400 and 499 s
+        self.assertEqual(parallel._last_dump_ts(
+            (self.path, 0, size, HexFilterLinux, {})), 499.0)
+        self.assertEqual(parallel._last_dump_ts(
+            (self.path, 0, size // 2, HexFilterLinux, {})), 250.0)
+        self.assertEqual(parallel._last_dump_ts(
+            (self.path, 0, size, HexFilterLinux, {'end_ts': 300.0})), 250.0)
+        self.assertIsNone(parallel._last_dump_ts(
+            (self.path, 0, size // 3, HexFilterLinux, {'start_ts': 260.0})))
+
+    def test_before_and_after_context(self):
+
+        self.assert_same_as_serial(abs_timestamps=True,
+                                   keep_n_lines_before_each_dump=2,
+                                   keep_n_lines_after_each_dump=2)
+
+    def test_before_context(self):
+
+        self.assert_same_as_serial(keep_n_lines_before_each_dump=3)
+
+    def test_after_context(self):
+
+        self.assert_same_as_serial(keep_n_lines_after_each_dump=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hexfilter import HexFilterLinux
+from hexfilter.seek import find_start_offset
+
+
+def _log_lines():
+    """ Returns the lines of a log with dumps every second, separated by a
+    few non hex lines. """
+
+    lines = []
+    for i in range(30):
+        ts = 10.0 + i
+        lines.append('[%12.6f] L%d before\n' % (ts, i))
+        for offset in range(0, 32, 16):
+            lines.append('[%12.6f] sdio wr %08x: %s  %s\n' %
+                         (ts + offset / 1000000.0, offset,
+                          ' '.join('%02x' % ((i + j) & 0xff)
+                                   for j in range(16)),
+                          '.' * 16))
+        for j in range(i % 4):
+            lines.append('[%12.6f] L%d.%d after\n' % (ts + 0.5, i, j))
+    return lines
+
+
+class TestFindStartOffset(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir)
+
+    def assert_same_as_full_scan(self, newline, **filter_kwargs):
+
+        path = os.path.join(self.tmp_dir, 'log.txt')
+        with open(path, 'wb') as fp:
+            fp.write(''.join(_log_lines()).replace('\n', newline)
+                     .encode('utf-8'))
+
+        with open(path, 'rb') as fp:
+            data = fp.read()
+            for start_ts in (0.0, 10.0, 12.000005, 12.5, 25.0, 39.0, 39.5,
+                             50.0):
+                hf = HexFilterLinux(start_ts=start_ts, **filter_kwargs)
+                full = b''.join(hf.filter_bytes(data))
+
+                hf = HexFilterLinux(start_ts=start_ts, **filter_kwargs)
+                start = find_start_offset(fp, hf)
+                self.assertLessEqual(start, len(data))
+                if 12.0 < start_ts < 40.0:
+                    self.assertGreater(start, 0)
+                self.assertEqual(b''.join(hf.filter_bytes(data, start=start)),
+                                 full, 'start_ts %f' % start_ts)
+
+    def test_delta_timestamps(self):
+
+        self.assert_same_as_full_scan('\n')
+
+    def test_abs_timestamps(self):
+
+        self.assert_same_as_full_scan('\n', abs_timestamps=True)
+
+    def test_before_context(self):
+
+        self.assert_same_as_full_scan('\n', abs_timestamps=True,
+                                      keep_n_lines_before_each_dump=2,
+                                      keep_n_lines_after_each_dump=1)
+
+    def test_crlf(self):
+
+        self.assert_same_as_full_scan('\r\n', abs_timestamps=True,
+                                      keep_n_lines_before_each_dump=2)
+
+    def test_cr(self):
+
+        self.assert_same_as_full_scan('\r', abs_timestamps=True,
+                                      keep_n_lines_before_each_dump=2)
+
+
+if __name__ == '__main__':
+    unittest.main()